@@ -6,13 +6,13 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
-from lib.beam import BEAMWalletAPI
-from config import BEAM_API_RPC, send_to_logs, VERIFIED_CA
+from config import create_beam_api, send_to_logs, VERIFIED_CA
 import asyncio
 from db import db
+from balances import read_totals
 from datetime import datetime
 
-beam_api = BEAMWalletAPI(BEAM_API_RPC)
+beam_api = create_beam_api(default_lane="admin", max_in_flight=2)  # Dashboard must not crowd out the daemons
 
 app = FastAPI(
     openapi_url=None,
@@ -94,7 +94,7 @@ async def balance_comparison():
         print("Comparing wallet balances...")
 
         # Fetch wallet balance from BEAM Wallet API
-        wallet_status = beam_api.wallet_status()
+        wallet_status = await beam_api.wallet_status()
         if not wallet_status or "totals" not in wallet_status:
             raise HTTPException(status_code=500, detail="Failed to fetch wallet status")
 
@@ -106,16 +106,8 @@ async def balance_comparison():
             locked = int(asset["locked_str"]) + int(asset['receiving_regular_str']) + int(asset['sending_regular_str'])
             wallet_balances[asset_id] = {"available": available, "locked": locked}
 
-        # Fetch database balances
-        db_balances = {}
-        async for address in db.addresses.find({}, {"balance": 1}):
-            for asset_id, amount in address["balance"]["available"].items():
-                db_balances.setdefault(asset_id, {"available": 0, "locked": 0})
-                db_balances[asset_id]["available"] += int(amount)
-
-            for asset_id, amount in address["balance"]["locked"].items():
-                db_balances.setdefault(asset_id, {"available": 0, "locked": 0})
-                db_balances[asset_id]["locked"] += int(amount)
+        # Fetch database balances (running totals)
+        db_balances = await read_totals()
 
         # Compare wallet and database balances
         comparison = []
@@ -4,11 +4,15 @@ from fastapi.openapi.utils import get_openapi
 from fastapi.openapi.docs import get_swagger_ui_html
 
 import asyncio
-from lib.beam import BEAMWalletAPI
 from db import db
-from config import BEAM_API_RPC, send_to_logs
+from balances import format_balance
+from ledger import LedgerBatch, lock_withdrawal, address_history
+from price_history import LEVELS, price_history, series_name
+from bson import ObjectId
+from config import create_beam_api, send_to_logs
 from auth import get_api_key
 import datetime
+import time
 
 import os
 
@@ -63,13 +67,18 @@ async def openapi(credentials: HTTPBasicCredentials = Depends(verify_credentials
     )
 
 
-beam_api = BEAMWalletAPI(BEAM_API_RPC)
+beam_api = create_beam_api(default_lane="tx_sync")
+
+
+@app.on_event("shutdown")
+async def close_wallet_api():
+    await beam_api.close()
 
 # --- API ENDPOINTS ---
 @app.post("/create_wallet", dependencies=[Depends(get_api_key)])
 async def create_wallet(note: str = Body(None), wallet_type: str = Body("regular")):
     """Create a new Beam wallet address with an optional note."""
-    address = beam_api.create_address(label=note, wallet_type=wallet_type)
+    address = await beam_api.create_address(label=note, wallet_type=wallet_type)
     if not address:
         raise HTTPException(status_code=500, detail="Failed to create address")
     
@@ -78,20 +87,21 @@ async def create_wallet(note: str = Body(None), wallet_type: str = Body("regular
         "type": wallet_type,
         "balance": {"available": {}, "locked": {}},
         "comment": note,
+        "added": time.time(),  # Picked up by the payment daemon's address index
     }
     await db.addresses.insert_one(address_data)
     return {"address": address, "note": note}
 
 @app.get("/wallet_status", dependencies=[Depends(get_api_key)])
 async def wallet_status():
-    wallet_status = beam_api.wallet_status()
+    wallet_status = await beam_api.wallet_status()
     print(wallet_status)
     return {"status": True, "result": wallet_status}
 
 @app.get("/validate_address", dependencies=[Depends(get_api_key)])
 async def validate_address(address: str):
     """Retrieve a list of addresses linked to a specific note."""
-    address = beam_api.validate_address(address)
+    address = await beam_api.validate_address(address)
     print(address)
     return {"status": True, "result": address['is_valid']}
 
@@ -113,6 +123,26 @@ async def get_assets():
     return assets
 
 
+@app.get("/prices/history")
+async def get_price_history(
+    asset_id: int,
+    quote: str = Query("usd", pattern="^(usd|beam)$"),
+    start: float = Query(...),
+    end: float = Query(None),
+    level: str = Query(None, pattern="^(minute|hour|day)$"),
+    max_points: int = Query(1000, ge=1, le=5000),
+):
+    """
+    Price history of an asset in USD or BEAM between two Unix timestamps.
+
+    Without `level`, the finest rollup (minute, hour, day) that covers the range is used.
+    """
+    start_time = datetime.datetime.utcfromtimestamp(start)
+    end_time = datetime.datetime.utcfromtimestamp(end) if end else None
+    level, points = await price_history(series_name(asset_id, quote), start_time, end_time, level=level, max_points=max_points)
+    return {"asset_id": asset_id, "quote": quote, "level": level, "interval": LEVELS[level][0], "points": points}
+
+
 @app.post("/withdraw", dependencies=[Depends(get_api_key)])
 async def withdraw(
     from_address: str = Body(...),
@@ -124,7 +154,8 @@ async def withdraw(
 ):
     """Validates and locks funds for withdrawal, actual transaction will be processed later."""
     # 1. Validate Address
-    address_info = beam_api.validate_address(to_address)
+    with beam_api.priority("withdrawal"):
+        address_info = await beam_api.validate_address(to_address)
     print("IS VALID ADDRESS:", address_info)
 
     if not address_info.get('is_valid'):
@@ -155,11 +186,11 @@ async def withdraw(
     if not from_address_data:
         raise HTTPException(status_code=404, detail="Sender address not found")
 
+    withdrawal_id = ObjectId()
+
     # Extract available balances
     available_balance = int(from_address_data["balance"]["available"].get(str(asset_id), "0"))
     available_beam = int(from_address_data["balance"]["available"].get("0", "0"))  # BEAM (0) balance
-    locked_beam = int(from_address_data["balance"]["locked"].get("0", "0"))  # Locked BEAM balance
-    locked_asset = int(from_address_data["balance"]["locked"].get(str(asset_id), "0"))  # Locked asset balance
 
     # Validate BEAM balance if it's the main asset (Gas Fees)
     if asset_id == 0:
@@ -168,16 +199,8 @@ async def withdraw(
             return {"status": False, "msg": "Insufficient BEAM balance (including transaction fee)"}
 
         # Lock funds
-        new_available_beam = available_beam - total_required
-        new_locked_beam = locked_beam + total_required
-
-        await db.addresses.update_one(
-            {"_id": from_address},
-            {"$set": {
-                f"balance.available.0": str(new_available_beam),
-                f"balance.locked.0": str(new_locked_beam)
-            }}
-        )
+        if not await lock_withdrawal(withdrawal_id, from_address, {"0": total_required}):
+            return {"status": False, "msg": "Insufficient BEAM balance (including transaction fee)"}
     else:  # If sending an Asset
         if available_balance < amount:
             return {"status": False, "msg": "Insufficient asset balance"}
@@ -186,32 +209,19 @@ async def withdraw(
             return {"status": False, "msg": "Insufficient BEAM balance for transaction fee"}
 
         # Lock asset amount & BEAM fee
-        new_available_asset = available_balance - amount
-        new_locked_asset = locked_asset + amount
-
-        new_available_beam = available_beam - fee
-        new_locked_beam = locked_beam + fee
-
-        await db.addresses.update_one(
-            {"_id": from_address},
-            {"$set": {
-                f"balance.available.{asset_id}": str(new_available_asset),
-                f"balance.locked.{asset_id}": str(new_locked_asset),
-                f"balance.available.0": str(new_available_beam),
-                f"balance.locked.0": str(new_locked_beam)
-            }}
-        )
+        if not await lock_withdrawal(withdrawal_id, from_address, {str(asset_id): amount, "0": fee}):
+            return {"status": False, "msg": "Insufficient asset balance"}
 
     # Handle Internal Transfers (Lock Receiver’s Balance)
     if receiver_address_data:
-        new_locked_receiver = int(receiver_address_data["balance"]["locked"].get(str(asset_id), "0")) + amount
-        await db.addresses.update_one(
-            {"_id": to_address},
-            {"$set": {f"balance.locked.{asset_id}": str(new_locked_receiver)}}
-        )
+        receiver_lock = LedgerBatch()
+        receiver_lock.add(withdrawal_id, "withdraw_lock", to_address, asset_id, locked_delta=amount)
+        await receiver_lock.write()
+        await receiver_lock.apply()
 
     # Store withdrawal in `pending_withdrawals`
     withdrawal_request = {
+        "_id": withdrawal_id,
         "status": "pending",
         "asset_id": asset_id,
         "value": str(amount),
@@ -230,6 +240,15 @@ async def withdraw(
     return {"status": True, "result": True, "msg": "Withdrawal request recorded"}
 
 
+@app.get("/withdrawal_queue", dependencies=[Depends(get_api_key)])
+async def get_withdrawal_queue():
+    """Withdrawal queue depth and time-to-send, as reported by the payment daemon's last cycle."""
+    stats = await db.sync_state.find_one({"_id": "withdrawal_queue"}, {"_id": 0})
+    if not stats:
+        raise HTTPException(status_code=404, detail="No withdrawal queue stats yet")
+    return stats
+
+
 @app.get("/deposits", dependencies=[Depends(get_api_key)])
 async def get_deposits(address: str = Body(None), asset_ids: list[str] = Body(...)):
     """Fetch deposits for a given user or address (with optional asset filtering)."""
@@ -248,7 +267,23 @@ async def get_balances(address: str):
     address_data = await db.addresses.find_one({"_id": address})
     if not address_data:
         raise HTTPException(status_code=404, detail="Address not found")
-    return address_data["balance"]
+    return format_balance(address_data["balance"])
+
+@app.get("/ledger", dependencies=[Depends(get_api_key)])
+async def get_ledger(address: str, limit: int = Query(100, le=1000)):
+    """Balance ledger entries of an address, oldest first."""
+    entries = await address_history(address, limit=limit)
+    return [
+        {
+            "ref": e["ref"],
+            "effect": e["effect"],
+            "asset_id": e["asset_id"],
+            "available": str(e["available"]),
+            "locked": str(e["locked"]),
+            "created": e["created"].timestamp(),
+        }
+        for e in entries
+    ]
 
 @app.get("/transactions", dependencies=[Depends(get_api_key)])
 async def get_transactions(
@@ -0,0 +1,224 @@
+"""
+Address balances.
+
+Balances are stored per address as Int64 groth amounts under `balance.available.<asset_id>` and
+`balance.locked.<asset_id>` and changed only with atomic `$inc` updates. `balance.pending.<asset_id>`
+holds the totals of the address's open withdrawals (value per asset, fees under asset 0), i.e.
+what its locked balance should be. Older deployments stored decimal strings; convert them once
+with `python migrate_balances.py`.
+
+`db.balance_totals` holds running per-asset totals of all address balances in one document, in the
+same shape as an address balance. Every balance `$inc` is followed by the same `$inc` of the totals,
+so reconciliation against the wallet reads one document; verify_totals() recounts all addresses
+now and then to check them.
+
+Ledger applications (see ledger.py) record their claim ID in `ledger_claims` of every document
+they change, in the same update as the `$inc`, so applying a claim again changes nothing.
+"""
+import datetime
+
+from bson.int64 import Int64
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from config import BALANCE_RECOUNT_INTERVAL
+from db import db
+
+BALANCE_KINDS = ("available", "locked", "pending")
+OPEN_WITHDRAWAL_STATUSES = ["pending", "processing", "sent", "admin_check"]  # Withdrawals counted in balance.pending
+TOTALS_ID = "totals"
+LEDGER_CLAIM_HISTORY = 1000  # Latest ledger claims kept per document to detect a repeated application
+
+
+def to_amount(value):
+    """Convert a groth amount (int or decimal string) to the stored Int64 type."""
+    return Int64(int(value))
+
+
+def balance_inc(asset_id, available_delta=0, locked_delta=0, pending_delta=0, inc=None):
+    """
+    Build (or extend) an `$inc` document for a balance change.
+
+    :param asset_id: Asset ID.
+    :param available_delta: Change of the available balance.
+    :param locked_delta: Change of the locked balance.
+    :param pending_delta: Change of the open withdrawal total.
+    :param inc: Existing `$inc` document to add the change to.
+    """
+    inc = {} if inc is None else inc
+    changes = [(f"balance.available.{asset_id}", available_delta), (f"balance.locked.{asset_id}", locked_delta)]
+    if pending_delta:
+        changes.append((f"balance.pending.{asset_id}", pending_delta))
+    for field, delta in changes:
+        inc[field] = to_amount(int(inc.get(field, 0)) + delta)
+    return inc
+
+
+def _claimed(query, update, claim):
+    """Make a balance update conditional on `claim` not being applied to the document yet, and record it."""
+    if claim is None:
+        return query, update
+    query = dict(query, ledger_claims={"$ne": claim})
+    update = dict(update, **{"$push": {"ledger_claims": {"$each": [claim], "$slice": -LEDGER_CLAIM_HISTORY}}})
+    return query, update
+
+
+def balance_updates(deltas, claim=None):
+    """
+    Build one `$inc` UpdateOne per address from accumulated deltas.
+
+    :param deltas: {(address, asset_id): (available_delta, locked_delta, pending_delta)}
+    :param claim: Optional ledger claim ID; addresses that already applied it are left unchanged.
+    """
+    incs = {}
+    for (address, asset_id), (available_delta, locked_delta, pending_delta) in deltas.items():
+        balance_inc(asset_id, available_delta, locked_delta, pending_delta, inc=incs.setdefault(address, {}))
+    return [UpdateOne(*_claimed({"_id": address}, {"$inc": inc}, claim)) for address, inc in incs.items()]
+
+
+async def add_to_totals(deltas, claim=None):
+    """
+    Add balance deltas to the running per-asset totals.
+
+    :param deltas: {(address, asset_id): (available_delta, locked_delta, pending_delta)}, as for balance_updates().
+    :param claim: Optional ledger claim ID; nothing is added if the totals already applied it.
+    """
+    inc = {}
+    for (address, asset_id), (available_delta, locked_delta, pending_delta) in deltas.items():
+        balance_inc(asset_id, available_delta, locked_delta, pending_delta, inc=inc)
+    if inc:
+        try:
+            await db.balance_totals.update_one(*_claimed({"_id": TOTALS_ID}, {"$inc": inc}, claim), upsert=True)
+        except DuplicateKeyError:
+            pass  # The totals exist and already applied the claim
+
+
+async def lock_funds(address, amounts):
+    """
+    Move funds from available to locked for a withdrawal if the address can cover all of them,
+    and add them to the address's open withdrawal totals.
+
+    The balance check and the change are a single conditional update, so concurrent
+    withdrawals can't both spend the same balance.
+
+    :param address: Address to lock funds on.
+    :param amounts: {asset_id: amount}
+    :return: True if the funds were locked.
+    """
+    query = {"_id": address}
+    inc = {}
+    for asset_id, amount in amounts.items():
+        query[f"balance.available.{asset_id}"] = {"$gte": to_amount(amount)}
+        balance_inc(asset_id, available_delta=-amount, locked_delta=amount, pending_delta=amount, inc=inc)
+    result = await db.addresses.update_one(query, {"$inc": inc})
+    if result.modified_count != 1:
+        return False
+    await db.balance_totals.update_one({"_id": TOTALS_ID}, {"$inc": inc}, upsert=True)
+    return True
+
+
+def format_balance(balance):
+    """Return a stored balance with string amounts, as exposed by the API."""
+    return {
+        kind: {asset_id: str(amount) for asset_id, amount in balance.get(kind, {}).items()}
+        for kind in ("available", "locked")
+    }
+
+
+def _per_asset(balance):
+    """{kind: {asset_id: amount}} -> {asset_id: {kind: int}}"""
+    totals = {}
+    for kind in BALANCE_KINDS:
+        for asset_id, amount in balance.get(kind, {}).items():
+            totals.setdefault(asset_id, dict.fromkeys(BALANCE_KINDS, 0))[kind] = int(amount)
+    return totals
+
+
+async def sum_balances():
+    """
+    Sum the balances of all addresses per asset on the server (a full scan; see read_totals()).
+
+    :return: {asset_id: {"available": int, "locked": int, "pending": int}}
+    """
+    totals = {}
+    for kind in BALANCE_KINDS:
+        pipeline = [
+            {"$project": {"amounts": {"$objectToArray": f"$balance.{kind}"}}},
+            {"$unwind": "$amounts"},
+            {"$group": {"_id": "$amounts.k", "total": {"$sum": {"$toLong": "$amounts.v"}}}},
+        ]
+        async for row in db.addresses.aggregate(pipeline):
+            totals.setdefault(row["_id"], dict.fromkeys(BALANCE_KINDS, 0))[kind] = int(row["total"])
+    return totals
+
+
+async def read_totals():
+    """
+    Running per-asset totals of all address balances.
+
+    :return: {asset_id: {"available": int, "locked": int, "pending": int}}
+    """
+    doc = await db.balance_totals.find_one({"_id": TOTALS_ID}) or {}
+    return _per_asset(doc.get("balance", {}))
+
+
+async def reset_totals():
+    """Set the running totals to a full recount. Run while no balances change (or at startup)."""
+    totals = await sum_balances()
+    balance = {
+        kind: {asset_id: to_amount(amounts[kind]) for asset_id, amounts in totals.items()}
+        for kind in BALANCE_KINDS
+    }
+    await db.balance_totals.replace_one({"_id": TOTALS_ID}, {"_id": TOTALS_ID, "balance": balance}, upsert=True)
+    return totals
+
+
+async def init_totals():
+    """Create the running totals from a full recount if they don't exist yet."""
+    if await db.balance_totals.find_one({"_id": TOTALS_ID}) is None:
+        await reset_totals()
+        print("📊 Initialized balance totals from a full recount.")
+
+
+def compare_totals(expected, actual):
+    """
+    Per-asset differences between two sets of totals.
+
+    :return: [{"asset_id", "kind", "expected", "actual"}]
+    """
+    differences = []
+    for asset_id in sorted(set(expected) | set(actual)):
+        for kind in BALANCE_KINDS:
+            e = expected.get(asset_id, {}).get(kind, 0)
+            a = actual.get(asset_id, {}).get(kind, 0)
+            if e != a:
+                differences.append({"asset_id": asset_id, "kind": kind, "expected": e, "actual": a})
+    return differences
+
+
+async def verify_totals(min_interval=BALANCE_RECOUNT_INTERVAL):
+    """
+    Check the running totals against a full recount of all addresses.
+
+    The result is stored in `db.sync_state` ("balance_totals"). If the totals changed while
+    counting, the check is inconclusive and retried on the next call.
+
+    :param min_interval: Skip if the last check is younger than this many seconds.
+    :return: List of differences (see compare_totals()), or None if skipped.
+    """
+    now = datetime.datetime.utcnow()
+    state = await db.sync_state.find_one({"_id": "balance_totals"}) or {}
+    if state.get("verified") and (now - state["verified"]).total_seconds() < min_interval:
+        return None
+
+    before = await read_totals()
+    recount = await sum_balances()
+    if await read_totals() != before:
+        return None  # Balances changed while counting
+
+    differences = compare_totals(recount, before)
+    await db.sync_state.update_one(
+        {"_id": "balance_totals"},
+        {"$set": {"verified": now, "differences": differences}},
+        upsert=True
+    )
+    return differences
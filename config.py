@@ -1,6 +1,8 @@
 import json
 import os
 from telegram.ext import ApplicationBuilder
+from lib.beam import AsyncBEAMWalletAPI, WalletGovernor, WalletResponseCache
+from lib.wallet_recording import WalletRecorder
 
 from dotenv import load_dotenv
 load_dotenv(dotenv_path='.env')
@@ -8,6 +10,13 @@ load_dotenv(dotenv_path='.env')
 # Get environment variables or fallback to default
 DATABASE_URL = os.getenv("DATABASE_URL")
 BEAM_API_RPC = os.getenv("BEAM_WALLET_API_RPC")
+BEAM_API_WS = os.getenv("BEAM_WALLET_API_WS")  # Optional WebSocket endpoint for push events; unset = polling only
+BEAM_API_POOL_SIZE = int(os.getenv("BEAM_WALLET_API_POOL_SIZE", 20))  # Keep-alive connections per process
+BEAM_API_TIMEOUT = float(os.getenv("BEAM_WALLET_API_TIMEOUT", 30))  # Seconds per RPC call
+BEAM_API_CACHE_SIZE = int(os.getenv("BEAM_WALLET_API_CACHE_SIZE", 0))  # Responses cached (e.g. 10000); 0 disables the response cache
+BEAM_API_MAX_IN_FLIGHT_PER_PROCESS = int(os.getenv("BEAM_WALLET_API_MAX_IN_FLIGHT_PER_PROCESS", 4))  # Simultaneous RPCs of one process; the wallet sees the sum over all processes
+BEAM_API_MAX_QUEUE = int(os.getenv("BEAM_WALLET_API_MAX_QUEUE", 1000))  # Waiting RPCs per priority lane
+BEAM_API_RECORD = os.getenv("BEAM_WALLET_API_RECORD")  # Optional file to record wallet traffic to (.jsonl or .jsonl.gz)
 
 
 # Load Telegram Bot Token from ENV
@@ -15,6 +24,19 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_GROUP_MONITOR_ID = os.getenv("TELEGRAM_GROUP_MONITOR_ID")
 
 CONFIRMATION_THRESHOLD = int(os.getenv("CONFIRMATION_THRESHOLD"))
+TX_SYNC_LOOKBACK = int(os.getenv("TX_SYNC_LOOKBACK", 86400))  # Seconds of tx history re-checked every cycle
+TX_SAFETY_SYNC_INTERVAL = int(os.getenv("TX_SAFETY_SYNC_INTERVAL", 300))  # Seconds between full tx syncs while push events are connected
+TX_WORKERS = int(os.getenv("TX_WORKERS", 8))  # Txs processed concurrently (per-address order is kept), 1 = sequential
+WITHDRAWAL_WORKERS = int(os.getenv("WITHDRAWAL_WORKERS", 4))  # Withdrawals sent concurrently (one per sender)
+WITHDRAWAL_INTERVAL = float(os.getenv("WITHDRAWAL_INTERVAL", 5))  # Seconds between withdrawal queue checks
+WITHDRAWAL_RETRY_DELAY = int(os.getenv("WITHDRAWAL_RETRY_DELAY", 90))  # Seconds before a failed withdrawal is retried
+WITHDRAWAL_CLAIM_TIMEOUT = int(os.getenv("WITHDRAWAL_CLAIM_TIMEOUT", 600))  # Seconds before a withdrawal claimed by a dead worker is reclaimed
+LEASE_TTL = int(os.getenv("LEASE_TTL", 30))  # Seconds before a dead worker's jobs are taken over by another process
+WITHDRAWAL_SHARDS = int(os.getenv("WITHDRAWAL_SHARDS", 8))  # Withdrawal senders are split into this many shards across workers
+WEBHOOK_SHARDS = int(os.getenv("WEBHOOK_SHARDS", 8))  # Webhook deliveries are split into this many shards across workers
+ASSET_REFRESH_INTERVAL = int(os.getenv("ASSET_REFRESH_INTERVAL", 600))  # Seconds between asset list refreshes from the node
+BALANCE_RECOUNT_INTERVAL = int(os.getenv("BALANCE_RECOUNT_INTERVAL", 3600))  # Seconds between full recounts checking the balance totals
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv("LEDGER_SNAPSHOT_INTERVAL", 86400))  # Seconds between balance ledger snapshots
 BEAMPAY_API_URL = os.getenv("BEAMPAY_API_URL")
 BEAMPAY_API_KEY = os.getenv("BEAMPAY_API_KEY")
 BEAMPAY_WEBHOOK_URLS = json.loads(os.getenv("BEAMPAY_WEBHOOK_URLS"))
@@ -27,6 +49,26 @@ SPAM_CA = json.loads(os.getenv("SPAM_CA"))
 TG_APP = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build() if TELEGRAM_BOT_TOKEN else None
 
 
+def create_beam_api(default_lane="admin", max_in_flight=None, **kwargs):
+    """
+    Create the async Beam Wallet API client configured from ENV.
+
+    The governor is per process and not shared: the wallet sees the sum of `max_in_flight` over
+    all running services and workers, so size each share to keep that sum within the wallet's limit.
+    """
+    return AsyncBEAMWalletAPI(
+        BEAM_API_RPC,
+        pool_size=BEAM_API_POOL_SIZE,
+        timeout=BEAM_API_TIMEOUT,
+        cache=WalletResponseCache(max_size=BEAM_API_CACHE_SIZE) if BEAM_API_CACHE_SIZE else None,
+        governor=WalletGovernor(max_in_flight=max_in_flight or BEAM_API_MAX_IN_FLIGHT_PER_PROCESS, max_queue=BEAM_API_MAX_QUEUE),
+        default_lane=default_lane,
+        recorder=WalletRecorder(BEAM_API_RECORD) if BEAM_API_RECORD else None,
+        ws_url=BEAM_API_WS,
+        **kwargs
+    )
+
+
 
 async def send_to_logs(text, ch="general", parse_mode=None):
     """Send logs/alerts to a Telegram chat."""
@@ -20,10 +20,24 @@ def update_indexes():
     db.txs.create_index([("sender", 1), ("receiver", 1)])  # Speed up address filtering
     db.txs.create_index([("status", 1)])  # Faster status queries
     db.txs.create_index([("asset_id", 1)])  # Queries based on asset types
+    db.txs.create_index([("success", 1), ("create_time", 1)])  # Unfinished txs outside the sync window
+    db.txs.create_index([("success", 1), ("last_checked", 1)])  # Least recently re-checked unfinished txs
 
     db.addresses.create_index([("_id", 1)])  # Speed up balance lookups
     db.addresses.create_index([("balance.available.0", -1)])  # Query BEAM balances faster
     db.addresses.create_index([("balance.available", 1)])  # Faster balance queries
+    db.addresses.create_index([("added", 1)])  # New addresses for the payment daemon's address index
+
+    db.ledger.create_index([("address", 1), ("created", 1)])  # Audit of one address
+    db.ledger.create_index([("created", 1)])  # Snapshot ranges
+    db.ledger.create_index([("applied", 1)])  # Entries not yet applied to balances
+    db.ledger_snapshots.create_index([("address", 1), ("cutoff", 1)])  # Latest snapshot per address
+
+    db.price_history.create_index([("series", 1), ("level", 1), ("bucket", 1)])  # Ranged price queries
+    db.price_history.create_index([("expires", 1)], expireAfterSeconds=0)  # Retention of minute/hour buckets
+
+    db.lease_members.create_index([("group", 1), ("expires", 1)])  # Live members of a shard group
+    db.lease_members.create_index([("expires", 1)], expireAfterSeconds=3600)  # Drop members of stopped workers
 
     db.pending_withdrawals.create_index([("sender", 1), ("status", 1)])  # Pending withdrawals by sender
     db.pending_withdrawals.create_index([("status", 1), ("create_time", 1)])  # Prioritize older withdrawals
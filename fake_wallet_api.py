@@ -0,0 +1,653 @@
+"""
+Fake Beam Wallet API for load and integration testing.
+
+Serves the JSON-RPC methods used by lib/beam.py from in-memory chain state, so the API,
+payment daemon and webhook worker can run without a live node and wallet-api process.
+
+Synthetic history (addresses, transactions, UTXOs) is generated on demand from its index,
+so millions of records cost no memory until something is created or changed at runtime.
+UTXOs are held in BEAM and the DEX assets; tx_send spends them (with change), confirmed
+deposits add new ones, and sends the UTXOs can't fund fail with "Not enough funds". Unspent
+UTXOs are indexed per asset by amount (one key each), so selecting, spending and paging them
+doesn't scan the whole set.
+
+Wallet events (ev_subunsub) are pushed to WebSocket clients on /ws.
+
+Usage:
+    python fake_wallet_api.py --port 10000 --addresses 1000000 --txs 5000000 --block-time 5
+    BEAM_WALLET_API_RPC="http://127.0.0.1:10000/api/wallet" python process_payments.py
+    BEAM_WALLET_API_WS="ws://127.0.0.1:10000/ws"  # Optional, enables push events
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from aiohttp import web
+from sortedcontainers import SortedList
+
+GROTH = 10**8
+FEE = 100000
+
+# Asset of synthetic UTXO i: UTXO_ASSETS[i % len(UTXO_ASSETS)]
+UTXO_ASSETS = [0, 0, 0, 7, 0, 0, 0, 9, 0, 0, 0, 47]
+
+# ev_txs_changed / ev_utxos_changed change types
+CHANGE_ADDED = 0
+CHANGE_UPDATED = 2
+
+# Canned DEX state returned by invoke_contract
+DEX_ASSETS = [
+    {"aid": 7, "metadata": "STD:SCH_VER=1;N=Beam Nephrite;SN=NPH;UN=NPH;NTHUN=GROTH;NTH_RATIO=100000000"},
+    {"aid": 9, "metadata": "STD:SCH_VER=1;N=Tico;SN=TICO;UN=TICO;NTHUN=GROTH;NTH_RATIO=100000000"},
+    {"aid": 47, "metadata": "STD:SCH_VER=1;N=Crown;SN=CRWN;UN=CRWN;NTHUN=GROTH;NTH_RATIO=100000000"},
+]
+DEX_POOLS = [
+    {"aid1": 0, "aid2": 7, "kind": 2, "tok1": 5000 * GROTH, "tok2": 250000 * GROTH, "ctl": 10000 * GROTH, "k1_2": 0.02, "k2_1": 50.0},
+    {"aid1": 7, "aid2": 9, "kind": 2, "tok1": 80000 * GROTH, "tok2": 4000 * GROTH, "ctl": 5000 * GROTH, "k1_2": 20.0, "k2_1": 0.05},
+    {"aid1": 0, "aid2": 47, "kind": 1, "tok1": 1200 * GROTH, "tok2": 600 * GROTH, "ctl": 800 * GROTH, "k1_2": 2.0, "k2_1": 0.5},
+]
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeWallet:
+    METHODS = {
+        "wallet_status", "block_details", "create_address", "addr_list", "edit_address", "delete_address",
+        "validate_address", "tx_list", "tx_status", "tx_send", "tx_cancel", "generate_tx_id",
+        "get_utxo", "assets_list", "get_asset_info", "invoke_contract",
+    }
+
+    def __init__(self, addresses=1000, txs=10000, utxos=1000, start_height=1000000, seed=1):
+        """
+        In-memory wallet and chain state.
+
+        :param addresses: Number of synthetic own addresses.
+        :param txs: Number of synthetic historical (completed) transactions.
+        :param utxos: Number of synthetic UTXOs (mostly BEAM, some of the DEX assets).
+        :param start_height: Chain height at startup.
+        :param seed: Seed for generated values.
+        """
+        self.seed = seed
+        self.synthetic_addresses = addresses
+        self.synthetic_txs = txs
+        self.synthetic_utxos = utxos
+        self.height = start_height
+        self.genesis_time = int(time.time()) - txs * 60  # One synthetic tx per minute of history
+        self.random = random.Random(seed)
+        self.available = {}  # asset_id -> total of unspent UTXOs
+        self.unspent = {}  # asset_id -> SortedList of (amount, id) of unspent UTXOs
+        keys = {}
+        for i in range(utxos):
+            asset_id, amount = UTXO_ASSETS[i % len(UTXO_ASSETS)], (i % 500 + 1) * GROTH  # As in synthetic_utxo()
+            keys.setdefault(asset_id, []).append((amount, f"u{i}"))
+            self.available[asset_id] = self.available.get(asset_id, 0) + amount
+        for asset_id, asset_keys in keys.items():
+            self.unspent[asset_id] = SortedList(asset_keys)
+
+        self.addresses = {}  # Runtime-created and edited addresses
+        self.txs = []  # Runtime transactions, oldest first
+        self.tx_index = {}  # txId -> runtime tx
+        self.runtime_utxos = {}  # id -> UTXO created at runtime (change, confirmed deposits)
+        self.listeners = []  # Callbacks (event, result) of subscribed WebSocket clients
+
+    # --- Synthetic records -------------------------------------------------
+
+    def _hex(self, *parts, size=33):
+        return hashlib.blake2b(":".join(map(str, (self.seed,) + parts)).encode(), digest_size=size).hexdigest()
+
+    def synthetic_address(self, i):
+        # The index is encoded in the first 12 hex chars so ownership checks need no lookup table
+        return f"{i:012x}{self._hex('addr', i)[12:]}"
+
+    def address_index(self, address):
+        try:
+            i = int(address[:12], 16)
+        except ValueError:
+            return None
+        if i < self.synthetic_addresses and self.synthetic_address(i) == address:
+            return i
+        return None
+
+    def address_info(self, i):
+        return {
+            "address": self.synthetic_address(i),
+            "comment": "",
+            "category": "",
+            "create_time": self.genesis_time + i,
+            "duration": 0,
+            "expired": i % 97 == 0,  # A few expired addresses to exercise sync_addresses
+            "own": True,
+            "own_id": i + 1,
+            "own_id_str": str(i + 1),
+            "identity": self._hex("identity", i, size=32),
+            "wallet_id": self._hex("wallet", i, size=32),
+            "type": "regular",
+        }
+
+    def synthetic_tx(self, i):
+        income = i % 4 != 0
+        own = self.synthetic_address(i % max(self.synthetic_addresses, 1))
+        external = self._hex("peer", i % 5000)
+        value = (i % 1000 + 1) * 100000
+        return {
+            "txId": self._hex("tx", i, size=16),
+            "asset_id": 0 if i % 10 else 7,
+            "comment": "",
+            "confirmations": 100,
+            "create_time": self.genesis_time + i * 60,
+            "fee": 0 if income else FEE,
+            "height": self.height - 100,
+            "income": income,
+            "kernel": self._hex("kernel", i, size=32),
+            "receiver": own if income else external,
+            "sender": external if income else own,
+            "sender_identity": "",
+            "receiver_identity": "",
+            "status": 3,
+            "status_string": "received" if income else "sent",
+            "tx_type": 0,
+            "tx_type_string": "simple",
+            "value": value,
+            "failure_reason": "",
+            "rates": [],
+        }
+
+    def synthetic_utxo(self, i):
+        return {
+            "id": f"u{i}",
+            "asset_id": UTXO_ASSETS[i % len(UTXO_ASSETS)],
+            "amount": (i % 500 + 1) * GROTH,
+            "maturity": self.height - 10,
+            "type": "norm",
+            "createTxId": self._hex("tx", i % max(self.synthetic_txs, 1), size=16),
+            "status": 1,
+            "status_string": "available",
+        }
+
+    def own_address(self, address):
+        return address in self.addresses or self.address_index(address) is not None
+
+    # --- UTXOs -------------------------------------------------------------
+
+    def utxo(self, utxo_id):
+        if utxo_id.startswith("u"):
+            return self.synthetic_utxo(int(utxo_id[1:]))
+        return self.runtime_utxos[utxo_id]
+
+    def utxos(self, asset_id=None, skip=0, count=None):
+        """
+        A page of unspent UTXOs, smallest first within an asset (assets in ID order).
+
+        :param asset_id: Only UTXOs of this asset; None lists all assets.
+        """
+        for aid in sorted(self.unspent) if asset_id is None else [asset_id]:
+            keys = self.unspent.get(aid, ())
+            if skip >= len(keys):
+                skip -= len(keys)
+                continue
+            stop = len(keys) if count is None else min(skip + count, len(keys))
+            for _, utxo_id in keys.islice(skip, stop):
+                yield self.utxo(utxo_id)
+            if count is not None:
+                count -= stop - skip
+                if not count:
+                    return
+            skip = 0
+
+    def add_utxo(self, asset_id, amount, tx_id):
+        utxo = {
+            "id": f"r{uuid.uuid4().hex[:12]}",
+            "asset_id": asset_id,
+            "amount": amount,
+            "maturity": self.height,
+            "type": "norm",
+            "createTxId": tx_id,
+            "status": 1,
+            "status_string": "available",
+        }
+        self.runtime_utxos[utxo["id"]] = utxo
+        self.unspent.setdefault(asset_id, SortedList()).add((amount, utxo["id"]))
+        self.available[asset_id] = self.available.get(asset_id, 0) + amount
+
+    def spend(self, asset_id, amount):
+        """
+        Mark UTXOs of an asset covering `amount` as spent, largest first.
+
+        :return: Change amount (selected UTXOs minus `amount`).
+        """
+        if self.available.get(asset_id, 0) < amount:
+            raise RPCError(-32603, "Not enough funds")
+        keys = self.unspent[asset_id]
+        total = 0
+        while total < amount:
+            utxo_amount, utxo_id = keys.pop()
+            self.runtime_utxos.pop(utxo_id, None)
+            total += utxo_amount
+        self.available[asset_id] -= total
+        return total - amount
+
+    # --- Chain progression -------------------------------------------------
+
+    def emit(self, event, result):
+        for listener in list(self.listeners):
+            listener(event, result)
+
+    def _refresh_tx(self, tx):
+        """Update status and confirmations of a runtime tx for the current height."""
+        if tx["status"] in (0, 1, 5) and self.height > tx["height"]:
+            tx["status"] = 3
+            tx["status_string"] = "received" if tx["income"] else "sent"
+            if tx["income"]:
+                self.add_utxo(tx["asset_id"], tx["value"], tx["txId"])
+            return True
+        if tx["status"] == 3:
+            confirmations = self.height - tx["height"]
+            if confirmations != tx["confirmations"]:
+                tx["confirmations"] = confirmations
+                return True
+        return False
+
+    def mine_block(self, deposits=0):
+        """Advance the chain by one block, confirming txs and optionally creating new deposits."""
+        self.height += 1
+        changed = [tx for tx in self.txs[-10000:] if self._refresh_tx(tx)]  # Old runtime txs are final
+        if changed:
+            self.emit("ev_txs_changed", {"change": CHANGE_UPDATED, "txs": changed})
+            self.emit("ev_utxos_changed", {"change": CHANGE_UPDATED, "utxos": []})
+        self.emit("ev_system_state", self.wallet_status({}))
+        for _ in range(deposits):
+            self.add_tx(
+                sender=self._hex("peer", self.random.randrange(5000)),
+                receiver=self.synthetic_address(self.random.randrange(max(self.synthetic_addresses, 1))),
+                value=self.random.randrange(1, 1000) * 100000,
+                asset_id=0,
+                fee=0,
+                income=True,
+            )
+
+    def add_tx(self, sender, receiver, value, asset_id, fee, income, comment=""):
+        tx = {
+            "txId": uuid.uuid4().hex,
+            "asset_id": asset_id,
+            "comment": comment,
+            "confirmations": 0,
+            "create_time": int(time.time()),
+            "fee": fee,
+            "height": self.height,
+            "income": income,
+            "kernel": self._hex("kernel", uuid.uuid4().hex, size=32),
+            "receiver": receiver,
+            "sender": sender,
+            "sender_identity": "",
+            "receiver_identity": "",
+            "status": 1,
+            "status_string": "in progress",
+            "tx_type": 0,
+            "tx_type_string": "simple",
+            "value": value,
+            "failure_reason": "",
+            "rates": [],
+        }
+        self.txs.append(tx)
+        self.tx_index[tx["txId"]] = tx
+        self.emit("ev_txs_changed", {"change": CHANGE_ADDED, "txs": [tx]})
+        return tx
+
+    # --- RPC methods -------------------------------------------------------
+
+    def wallet_status(self, params):
+        available = self.available.get(0, 0)
+        return {
+            "current_height": self.height,
+            "current_state_hash": self._hex("block", self.height, size=32),
+            "prev_state_hash": self._hex("block", self.height - 1, size=32),
+            "is_in_sync": True,
+            "available": available,
+            "receiving": 0,
+            "sending": 0,
+            "maturing": 0,
+            "difficulty": 1.0,
+            "totals": [
+                {
+                    "asset_id": asset_id,
+                    "available": amount,
+                    "available_str": str(amount),
+                    "locked": 0,
+                    "locked_str": "0",
+                    "receiving_regular_str": "0",
+                    "sending_regular_str": "0",
+                }
+                for asset_id, amount in sorted(self.available.items())
+            ],
+        }
+
+    def block_details(self, params):
+        height = int(params["height"])
+        if height > self.height:
+            raise RPCError(-32602, "Block not found")
+        return {
+            "height": height,
+            "block_hash": self._hex("block", height, size=32),
+            "previous_block": self._hex("block", height - 1, size=32),
+            "timestamp": self.genesis_time + height,
+        }
+
+    def create_address(self, params):
+        address = self._hex("new_addr", uuid.uuid4().hex)
+        self.addresses[address] = {
+            "address": address,
+            "comment": params.get("comment", ""),
+            "category": "",
+            "create_time": int(time.time()),
+            "duration": 0,
+            "expired": False,
+            "own": True,
+            "own_id": len(self.addresses) + self.synthetic_addresses + 1,
+            "identity": self._hex("identity", address, size=32),
+            "wallet_id": self._hex("wallet", address, size=32),
+            "type": params.get("type", "regular"),
+        }
+        return address
+
+    def addr_list(self, params):
+        if not params.get("own", True):
+            return []
+        result = [self.address_info(i) for i in range(self.synthetic_addresses) if self.synthetic_address(i) not in self.addresses]
+        return result + list(self.addresses.values())
+
+    def edit_address(self, params):
+        address = params["address"]
+        i = self.address_index(address)
+        if address not in self.addresses:
+            if i is None:
+                raise RPCError(-32602, "Address not found")
+            self.addresses[address] = self.address_info(i)
+        if params.get("expiration"):
+            self.addresses[address]["expired"] = params["expiration"] == "expired"
+        if params.get("comment") is not None:
+            self.addresses[address]["comment"] = params["comment"]
+        return "done"
+
+    def delete_address(self, params):
+        self.addresses.pop(params["address"], None)
+        return "done"
+
+    def validate_address(self, params):
+        address = params.get("address", "")
+        try:
+            int(address, 16)
+            is_valid = len(address) >= 60
+        except ValueError:
+            is_valid = False
+        return {
+            "is_valid": is_valid,
+            "is_mine": is_valid and self.own_address(address),
+            "type": "offline" if len(address) > 100 else "regular",
+        }
+
+    def tx_list(self, params):
+        count = int(params.get("count", 100)) or self.synthetic_txs + len(self.txs)
+        skip = int(params.get("skip", 0))
+        status = params.get("filter", {}).get("status")
+        result = []
+        # Newest first: runtime txs, then synthetic history
+        for tx in reversed(self.txs):
+            if status is not None and tx["status"] != status:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            if len(result) >= count:
+                return result
+            result.append(tx)
+        if status not in (None, 3):
+            return result
+        for i in range(self.synthetic_txs - 1 - skip, -1, -1):
+            if len(result) >= count:
+                break
+            result.append(self.synthetic_tx(i))
+        return result
+
+    def tx_status(self, params):
+        tx = self.tx_index.get(params["txId"])
+        if tx is None:
+            raise RPCError(-32602, "Transaction not found")
+        return tx
+
+    def tx_send(self, params):
+        value = int(params["value"])
+        fee = int(params.get("fee", FEE))
+        asset_id = int(params.get("asset_id", 0))
+        if value <= 0:
+            raise RPCError(-32602, "Invalid value")
+        required = {asset_id: value, 0: fee} if asset_id else {0: value + fee}
+        if any(self.available.get(a, 0) < amount for a, amount in required.items()):
+            raise RPCError(-32603, "Not enough funds")
+        tx = self.add_tx(
+            sender=params.get("from", ""),
+            receiver=params["address"],
+            value=value,
+            asset_id=asset_id,
+            fee=fee,
+            income=False,
+            comment=params.get("comment", ""),
+        )
+        for a, amount in required.items():
+            change = self.spend(a, amount)
+            if change:
+                self.add_utxo(a, change, tx["txId"])
+        self.emit("ev_utxos_changed", {"change": CHANGE_UPDATED, "utxos": []})
+        return {"txId": tx["txId"]}
+
+    def tx_cancel(self, params):
+        tx = self.tx_index.get(params["txId"])
+        if tx is None or tx["status"] not in (0, 1, 5):
+            return False
+        tx["status"] = 2
+        tx["status_string"] = "cancelled"
+        if not tx["income"]:
+            # The spent UTXOs come back (as new ones)
+            self.add_utxo(tx["asset_id"], tx["value"], tx["txId"])
+            if tx["fee"]:
+                self.add_utxo(0, tx["fee"], tx["txId"])
+            self.emit("ev_utxos_changed", {"change": CHANGE_UPDATED, "utxos": []})
+        self.emit("ev_txs_changed", {"change": CHANGE_UPDATED, "txs": [tx]})
+        return True
+
+    def generate_tx_id(self, params):
+        return uuid.uuid4().hex
+
+    def get_utxo(self, params):
+        count = int(params.get("count", 0))
+        skip = int(params.get("skip", 0))
+        asset_id = params.get("filter", {}).get("asset_id")
+        return list(self.utxos(None if asset_id is None else int(asset_id), skip, count or None))
+
+    def assets_list(self, params):
+        height = params.get("height") or self.height
+        return [
+            {
+                "asset_id": asset["aid"],
+                "metadata": asset["metadata"],
+                "emission": 10**15,
+                "emission_str": str(10**15),
+                "confirmations": 0,
+                "height": self.height - 1000,
+                "issue_height": 100 + asset["aid"],
+                "owner_id": self._hex("owner", asset["aid"], size=32),
+            }
+            for asset in DEX_ASSETS if 100 + asset["aid"] <= height
+        ]
+
+    def get_asset_info(self, params):
+        for asset in self.assets_list({}):
+            if asset["asset_id"] == int(params["asset_id"]):
+                return asset
+        raise RPCError(-32602, "Asset not found")
+
+    def invoke_contract(self, params):
+        args = params.get("args", "")
+        if "action=view_all_assets" in args:
+            return {"output": json.dumps({"res": DEX_ASSETS})}
+        if "action=pools_view" in args:
+            return {"output": json.dumps({"res": DEX_POOLS})}
+        return {"output": json.dumps({})}
+
+    def call(self, method, params):
+        if method not in self.METHODS:
+            raise RPCError(-32601, f"Method not found: {method}")
+        return getattr(self, method)(params or {})
+
+
+class FakeWalletServer:
+    def __init__(self, wallet, latency=0.0, jitter=0.0, error_rate=0.0, block_time=60.0, deposits_per_block=0):
+        """
+        JSON-RPC HTTP front end for a FakeWallet.
+
+        :param latency: Base response latency in seconds.
+        :param jitter: Random extra latency in seconds (uniform 0..jitter).
+        :param error_rate: Probability of answering a request with an error (half HTTP 500, half JSON-RPC).
+        :param block_time: Seconds between blocks (0 disables block production).
+        :param deposits_per_block: Incoming deposits created with every block.
+        """
+        self.wallet = wallet
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.block_time = block_time
+        self.deposits_per_block = deposits_per_block
+        self.requests = 0
+
+    def _rpc(self, request):
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            if self.error_rate and self.wallet.random.random() < self.error_rate / 2:
+                raise RPCError(-32603, "Injected error")
+            response["result"] = self.wallet.call(request.get("method", ""), request.get("params"))
+        except RPCError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        except (KeyError, TypeError, ValueError) as e:
+            response["error"] = {"code": -32602, "message": f"Invalid params: {e}"}
+        return response
+
+    async def handle(self, request):
+        self.requests += 1
+        delay = self.latency + (self.wallet.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.wallet.random.random() < self.error_rate / 2:
+            return web.Response(status=500, text="Injected HTTP error")
+
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}})
+
+        if isinstance(payload, list):
+            return web.json_response([self._rpc(r) for r in payload])
+        return web.json_response(self._rpc(payload))
+
+    async def handle_ws(self, request):
+        """
+        JSON-RPC over WebSocket, with ev_subunsub push events.
+        """
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subscriptions = set()
+        outbox = asyncio.Queue()
+
+        def listener(event, result):
+            if event in subscriptions:
+                outbox.put_nowait({"jsonrpc": "2.0", "id": event, "result": result})
+
+        async def send():
+            while True:
+                await ws.send_json(await outbox.get())
+
+        sender = asyncio.create_task(send())
+        self.wallet.listeners.append(listener)
+        try:
+            async for message in ws:
+                if message.type != web.WSMsgType.TEXT:
+                    break
+                self.requests += 1
+                request_data = json.loads(message.data)
+                if request_data.get("method") == "ev_subunsub":
+                    for event, enabled in (request_data.get("params") or {}).items():
+                        (subscriptions.add if enabled else subscriptions.discard)(event)
+                    outbox.put_nowait({"jsonrpc": "2.0", "id": request_data.get("id"), "result": True})
+                else:
+                    outbox.put_nowait(self._rpc(request_data))
+        finally:
+            self.wallet.listeners.remove(listener)
+            sender.cancel()
+        return ws
+
+    async def produce_blocks(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            self.wallet.mine_block(self.deposits_per_block)
+
+    async def on_startup(self, app):
+        if self.block_time:
+            app["block_producer"] = asyncio.create_task(self.produce_blocks())
+
+    async def on_cleanup(self, app):
+        if "block_producer" in app:
+            app["block_producer"].cancel()
+
+    def make_app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/", self.handle)
+        app.router.add_post("/api/wallet", self.handle)
+        app.router.add_get("/ws", self.handle_ws)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Beam Wallet API for load and integration testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10000)
+    parser.add_argument("--addresses", type=int, default=1000, help="Synthetic own addresses")
+    parser.add_argument("--txs", type=int, default=10000, help="Synthetic historical transactions")
+    parser.add_argument("--utxos", type=int, default=1000, help="Synthetic UTXOs (mostly BEAM, some DEX assets)")
+    parser.add_argument("--start-height", type=int, default=1000000)
+    parser.add_argument("--block-time", type=float, default=60.0, help="Seconds per block, 0 to freeze the chain")
+    parser.add_argument("--deposits-per-block", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    wallet = FakeWallet(
+        addresses=args.addresses,
+        txs=args.txs,
+        utxos=args.utxos,
+        start_height=args.start_height,
+        seed=args.seed,
+    )
+    server = FakeWalletServer(
+        wallet,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        block_time=args.block_time,
+        deposits_per_block=args.deposits_per_block,
+    )
+    print(f"Fake Beam Wallet API on http://{args.host}:{args.port}/api/wallet (height {wallet.height})")
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
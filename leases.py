@@ -0,0 +1,205 @@
+"""
+Mongo-backed leases, so several worker processes can share the daemons' jobs.
+
+A Lease makes one process the owner of a job (`db.leases`, one document per lease). The owner
+renews it with heartbeats; if it stops, another process takes the lease over once it expired.
+Every takeover increments the lease's fencing token. Writes made on behalf of a lease can be
+fenced with Lease.fenced_update(), which rejects them once a newer token wrote the document.
+
+ShardLeases splits work by key (e.g. withdrawal sender) into a fixed number of shards and
+balances them over the live processes of a group (`db.lease_members`).
+"""
+import asyncio
+import datetime
+import hashlib
+import math
+import os
+import random
+import socket
+import time
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import LEASE_TTL
+from db import db
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"  # This process
+EXPIRED = datetime.datetime(1970, 1, 1)
+
+
+def shard_of(key, shards):
+    """Stable shard number of a key."""
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big") % shards
+
+
+class Lease:
+    def __init__(self, name, ttl=LEASE_TTL, owner=OWNER):
+        """
+        Exclusive, expiring ownership of a named job.
+
+        The lease counts as held locally until a third of the TTL before it expires in the
+        database, which leaves room for clock skew between processes.
+
+        :param name: Lease name, e.g. 'tx_sync'.
+        :param ttl: Seconds a heartbeat keeps the lease.
+        :param owner: Owner ID, this process by default.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner
+        self.token = None  # Fencing token while held
+        self.valid_until = 0
+
+    @property
+    def held(self):
+        return self.token is not None and time.time() < self.valid_until
+
+    def _extend(self, started):
+        self.valid_until = started + self.ttl * 2 / 3
+
+    async def heartbeat(self):
+        """
+        Renew the lease if held, otherwise try to take it.
+
+        :return: True if the lease is held.
+        """
+        started = time.time()
+        expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+        if self.token is not None:
+            result = await db.leases.update_one(
+                {"_id": self.name, "owner": self.owner, "token": self.token},
+                {"$set": {"expires": expires}}
+            )
+            if result.matched_count:
+                self._extend(started)
+                return True
+            print(f"🔓 Lost lease {self.name} (token {self.token})")
+            self.token = None
+
+        try:
+            lease = await db.leases.find_one_and_update(
+                {"_id": self.name, "expires": {"$lt": datetime.datetime.utcnow()}},
+                {"$set": {"owner": self.owner, "expires": expires}, "$inc": {"token": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return False  # Held by another process
+        self.token = lease["token"]
+        self._extend(started)
+        print(f"🔒 Acquired lease {self.name} (token {self.token})")
+        return True
+
+    async def release(self):
+        """Give the lease up so another process can take it right away."""
+        if self.token is not None:
+            await db.leases.update_one(
+                {"_id": self.name, "owner": self.owner, "token": self.token},
+                {"$set": {"expires": EXPIRED}}
+            )
+            self.token = None
+
+    async def fenced_update(self, collection, query, update, upsert=False):
+        """
+        Update a document only if no newer lease holder wrote it.
+
+        The document records the token of its last fenced write in `fence`.
+
+        :return: True if the update was applied.
+        """
+        if not self.held:
+            return False
+        fenced_query = dict(query, fence={"$not": {"$gt": self.token}})  # Also matches unfenced documents
+        update = dict(update, **{"$set": dict(update.get("$set", {}), fence=self.token)})
+        try:
+            result = await collection.update_one(fenced_query, update, upsert=upsert)
+        except DuplicateKeyError:
+            return False  # The document exists with a newer fence
+        return bool(result.matched_count or result.upserted_id)
+
+
+class ShardLeases:
+    def __init__(self, name, shards, ttl=LEASE_TTL, owner=OWNER):
+        """
+        Leases on `shards` shards of a job, spread evenly over the live members of the group.
+
+        Every heartbeat registers this process as a member, renews its shards, releases shards
+        above its fair share (shards / members) and takes free ones up to it.
+
+        :param name: Group name, e.g. 'withdrawals'; shard leases are named '<name>:<shard>'.
+        :param shards: Number of shards.
+        :param ttl: Seconds a heartbeat keeps a lease.
+        """
+        self.name = name
+        self.shards = shards
+        self.ttl = ttl
+        self.owner = owner
+        self.leases = [Lease(f"{name}:{shard}", ttl=ttl, owner=owner) for shard in range(shards)]
+
+    def held(self):
+        """Shard numbers currently held."""
+        return {shard for shard, lease in enumerate(self.leases) if lease.held}
+
+    def owns(self, key):
+        return self.leases[shard_of(key, self.shards)].held
+
+    async def _members(self):
+        now = datetime.datetime.utcnow()
+        await db.lease_members.update_one(
+            {"_id": f"{self.name}:{self.owner}"},
+            {"$set": {"group": self.name, "expires": now + datetime.timedelta(seconds=self.ttl)}},
+            upsert=True
+        )
+        return await db.lease_members.count_documents({"group": self.name, "expires": {"$gte": now}})
+
+    async def heartbeat(self):
+        """
+        Renew, release and take shard leases.
+
+        :return: Shard numbers held.
+        """
+        fair_share = math.ceil(self.shards / max(await self._members(), 1))
+        held = [lease for lease in self.leases if lease.token is not None]
+        for lease in held:
+            await lease.heartbeat()
+        held = [lease for lease in held if lease.token is not None]
+
+        for lease in held[fair_share:]:
+            await lease.release()
+        free = [lease for lease in self.leases if lease.token is None]
+        random.shuffle(free)  # Members starting together don't all race for the same shards
+        for lease in free:
+            if len(held) >= fair_share:
+                break
+            if await lease.heartbeat():
+                held.append(lease)
+        return self.held()
+
+    async def release(self):
+        for lease in self.leases:
+            await lease.release()
+        await db.lease_members.delete_one({"_id": f"{self.name}:{self.owner}"})
+
+
+async def keep_leases(leases, interval=None):
+    """
+    Heartbeat leases (Lease or ShardLeases) until cancelled, every third of the shortest TTL.
+
+    A failed heartbeat is logged; the lease then runs out on its own.
+    """
+    interval = interval or min(lease.ttl for lease in leases) / 3
+    try:
+        while True:
+            for lease in leases:
+                try:
+                    await lease.heartbeat()
+                except Exception as e:
+                    print(f"⚠️ Lease heartbeat of {lease.name} failed: {e!r}")
+            await asyncio.sleep(interval)
+    finally:
+        for lease in leases:
+            try:
+                await lease.release()
+            except Exception:
+                pass
@@ -0,0 +1,398 @@
+"""
+Append-only balance ledger.
+
+Every balance effect is one entry in `db.ledger`, keyed by (ref, effect, address, asset_id), so
+retrying an effect is a no-op. `db.addresses.balance` is a projection of the ledger: entries are
+claimed, applied with `$inc` and then marked `applied`, so concurrent workers apply each entry
+once. Snapshots in `db.ledger_snapshots` fold old entries per address, so a rebuild only has to
+read the latest snapshot plus the entries after it.
+
+    python ledger.py open                  # once, after migrate_balances.py: opening entries for existing balances
+    python ledger.py reconcile-pending     # once, then on demand: correct open withdrawal totals (stop the services first)
+    python ledger.py snapshot              # fold entries into snapshots (also done by process_payments)
+    python ledger.py rebuild [--address A] # recompute balances from snapshots + ledger (stop the services first)
+    python ledger.py recount-totals        # reset the running balance totals to a full recount (stop the services first)
+    python ledger.py history ADDRESS       # audit one address
+"""
+import argparse
+import asyncio
+import datetime
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from balances import BALANCE_KINDS, OPEN_WITHDRAWAL_STATUSES, to_amount, balance_updates, lock_funds
+from balances import add_to_totals, reset_totals
+from config import LEDGER_SNAPSHOT_INTERVAL
+from db import db
+
+SNAPSHOT_MARGIN = 300  # Seconds; newer entries may still be in flight and are left for the next snapshot
+CLAIM_TIMEOUT = 300  # Seconds after which a claim of a crashed worker is applied by apply_pending_entries
+
+
+def entry_id(ref, effect, address, asset_id):
+    return f"{ref}:{effect}:{address}:{asset_id}"
+
+
+class LedgerBatch:
+    def __init__(self):
+        """
+        Balance effects collected for one bulk write.
+
+        Effects with the same (ref, effect, address, asset_id) are merged into one entry.
+        """
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, ref, effect, address, asset_id, available_delta=0, locked_delta=0, pending_delta=0):
+        """
+        Add a balance effect.
+
+        :param ref: What caused the effect (tx ID or withdrawal ID).
+        :param effect: Effect type, e.g. 'lock', 'finalize', 'fail'.
+        :param address: Address whose balance changes.
+        :param asset_id: Asset ID.
+        :param available_delta: Change of the available balance.
+        :param locked_delta: Change of the locked balance.
+        :param pending_delta: Change of the open withdrawal total.
+        """
+        asset_id = str(asset_id)
+        _id = entry_id(ref, effect, address, asset_id)
+        entry = self.entries.setdefault(_id, {
+            "_id": _id, "ref": str(ref), "effect": effect, "address": address, "asset_id": asset_id,
+            "available": 0, "locked": 0, "pending": 0,
+        })
+        entry["available"] += available_delta
+        entry["locked"] += locked_delta
+        entry["pending"] += pending_delta
+
+    async def write(self, applied=False):
+        """Insert the entries; entries recorded by an earlier attempt are left as they are."""
+        if not self.entries:
+            return
+        now = datetime.datetime.utcnow()
+        docs = [
+            dict(e, **{kind: to_amount(e[kind]) for kind in BALANCE_KINDS}, created=now, applied=applied)
+            for e in self.entries.values()
+        ]
+        try:
+            await db.ledger.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def apply(self):
+        """Apply the batch's entries that are not applied yet (including leftovers of an earlier attempt)."""
+        if self.entries:
+            await apply_entries({"_id": {"$in": list(self.entries)}, "applied": False})
+
+    async def discard(self, refs):
+        """
+        Drop the entries of the given refs, also from the ledger if they were written but not applied yet.
+
+        :param refs: Refs (tx IDs) whose effects turned out not to happen.
+        """
+        refs = {str(ref) for ref in refs}
+        ids = [_id for _id, e in self.entries.items() if e["ref"] in refs]
+        for _id in ids:
+            del self.entries[_id]
+        if ids:
+            await db.ledger.delete_many({"_id": {"$in": ids}, "applied": False})
+
+    def clear(self):
+        self.entries = {}
+
+
+async def apply_entries(query):
+    """
+    Apply unapplied ledger entries to the address balances and the running balance totals.
+
+    Matching entries are first claimed (`applied` set to a new ObjectId) with one conditional
+    update, so of several workers applying the same entries each entry is applied by one.
+    A crash after claiming leaves the claim to apply_pending_entries (after CLAIM_TIMEOUT).
+
+    :return: Number of applied entries.
+    """
+    ids = [e["_id"] for e in await db.ledger.find(query, {"_id": 1}).to_list(None)]
+    if not ids:
+        return 0
+    claim = ObjectId()
+    await db.ledger.update_many({"$and": [query, {"_id": {"$in": ids}}]}, {"$set": {"applied": claim}})
+    return await apply_claim(claim)
+
+
+async def apply_claim(claim):
+    """
+    Apply the entries of a claim and mark them applied.
+
+    Every balance document records the claim with its `$inc` (see balances.py), so applying a
+    claim again, e.g. after a crash before the entries were marked, doesn't count them twice.
+
+    :return: Number of applied entries.
+    """
+    entries = await db.ledger.find({"applied": claim}).to_list(None)
+    if not entries:
+        return 0  # Claimed by another worker
+
+    deltas = {}
+    for e in entries:
+        delta = deltas.setdefault((e["address"], e["asset_id"]), [0, 0, 0])
+        for i, kind in enumerate(BALANCE_KINDS):
+            delta[i] += int(e.get(kind, 0))
+
+    await db.addresses.bulk_write(balance_updates(deltas, claim=claim), ordered=False)
+    await add_to_totals(deltas, claim=claim)
+    await db.ledger.update_many({"applied": claim}, {"$set": {"applied": True}})
+    return len(entries)
+
+
+async def apply_pending_entries():
+    """
+    Apply entries left by interrupted runs: unclaimed entries and claims older than CLAIM_TIMEOUT.
+
+    Younger entries are left alone; their writer may still apply (or discard) them. Stale claims
+    are applied again under their own claim ID, which skips the documents that already have them.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=CLAIM_TIMEOUT)
+    applied = await apply_entries({"applied": False, "created": {"$lt": cutoff}})
+    for claim in await db.ledger.distinct("applied", {"applied": {"$type": "objectId", "$lt": ObjectId.from_datetime(cutoff)}}):
+        applied += await apply_claim(claim)
+    if applied:
+        print(f"📒 Applied {applied} pending ledger entries.")
+
+
+async def lock_withdrawal(ref, address, amounts):
+    """
+    Lock funds for a withdrawal and record it in the ledger.
+
+    The balance check and the lock are one conditional update (see `balances.lock_funds`),
+    the ledger entry is written after it succeeded.
+
+    :param ref: Withdrawal ID.
+    :param address: Sender address.
+    :param amounts: {asset_id: amount}
+    :return: True if the funds were locked.
+    """
+    if not await lock_funds(address, amounts):
+        return False
+    batch = LedgerBatch()
+    for asset_id, amount in amounts.items():
+        batch.add(ref, "withdraw_lock", address, asset_id, available_delta=-amount, locked_delta=amount, pending_delta=amount)
+    await batch.write(applied=True)
+    return True
+
+
+async def address_history(address, since=None, limit=100):
+    """
+    Ledger entries of an address, oldest first.
+
+    :param address: Address.
+    :param since: Only entries created at or after this datetime.
+    :param limit: Max entries.
+    """
+    query = {"address": address}
+    if since:
+        query["created"] = {"$gte": since}
+    return await db.ledger.find(query).sort("created", 1).limit(limit).to_list(None)
+
+
+async def open_ledger():
+    """
+    Record the current balances of addresses without ledger history as 'opening' entries.
+
+    Run once after upgrading (after migrate_balances.py), before starting the services.
+    """
+    known = set(await db.ledger.distinct("address"))
+    batch = LedgerBatch()
+    async for address in db.addresses.find({}, {"balance": 1}):
+        if address["_id"] in known:
+            continue
+        balance = address.get("balance", {})
+        for asset_id in set().union(*(balance.get(kind, {}) for kind in BALANCE_KINDS)):
+            amounts = [int(balance.get(kind, {}).get(asset_id, 0)) for kind in BALANCE_KINDS]
+            if any(amounts):
+                batch.add("opening", "opening", address["_id"], asset_id, *amounts)
+    await batch.write(applied=True)
+    await reset_totals()
+    print(f"📒 Recorded {len(batch)} opening entries.")
+
+
+async def _snapshot_cutoff():
+    state = await db.sync_state.find_one({"_id": "ledger_snapshot"}) or {}
+    return state.get("cutoff")
+
+
+async def take_snapshots(min_interval=LEDGER_SNAPSHOT_INTERVAL):
+    """
+    Fold ledger entries since the last snapshot into per-address snapshots.
+
+    Only addresses with new entries get a new snapshot. The new cutoff is committed in
+    `db.sync_state` after all snapshots are written, so an interrupted run has no effect.
+
+    :param min_interval: Skip if the last snapshot is younger than this many seconds.
+    """
+    previous = await _snapshot_cutoff()
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=SNAPSHOT_MARGIN)
+    if previous and (cutoff - previous).total_seconds() < min_interval:
+        return
+
+    # Leftovers of an interrupted run
+    if previous:
+        await db.ledger_snapshots.delete_many({"cutoff": {"$gt": previous}})
+
+    match = {"created": {"$lt": cutoff}}
+    if previous:
+        match["created"]["$gte"] = previous
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"address": "$address", "asset_id": "$asset_id"},
+            **{kind: {"$sum": f"${kind}"} for kind in BALANCE_KINDS},
+        }},
+    ]
+    deltas = {}
+    async for row in db.ledger.aggregate(pipeline):
+        deltas.setdefault(row["_id"]["address"], {})[row["_id"]["asset_id"]] = row
+
+    if deltas:
+        latest = await _latest_snapshots(list(deltas), previous)
+        ops = []
+        for address, assets in deltas.items():
+            balance = latest.get(address, {})
+            for asset_id, row in assets.items():
+                _add_amounts(balance, asset_id, row)
+            ops.append(InsertOne({
+                "_id": f"{address}:{int(cutoff.timestamp())}",
+                "address": address,
+                "cutoff": cutoff,
+                "balance": balance,
+            }))
+        for i in range(0, len(ops), 1000):
+            await db.ledger_snapshots.bulk_write(ops[i:i + 1000], ordered=False)
+
+    await db.sync_state.update_one({"_id": "ledger_snapshot"}, {"$set": {"cutoff": cutoff}}, upsert=True)
+    if deltas:
+        await db.ledger_snapshots.delete_many({"address": {"$in": list(deltas)}, "cutoff": {"$lt": cutoff}})
+    print(f"📒 Ledger snapshot at {cutoff}: {len(deltas)} addresses updated.")
+
+
+def _add_amounts(balance, asset_id, amounts):
+    """Add the per-kind amounts of a ledger entry (or sum of entries) to a balance document."""
+    for kind in BALANCE_KINDS:
+        if amounts.get(kind) or kind != "pending":
+            current = balance.setdefault(kind, {}).get(asset_id, 0)
+            balance[kind][asset_id] = to_amount(int(current) + int(amounts.get(kind, 0)))
+
+
+def _complete(balance):
+    balance.setdefault("available", {})
+    balance.setdefault("locked", {})
+    return balance
+
+
+async def reconcile_pending():
+    """
+    Correct `balance.pending` of all addresses to the totals of their open withdrawals.
+
+    Writes one 'pending_fix' ledger entry per difference. Run once after upgrading and whenever
+    the withdrawal queue reports mismatches caused by the totals; stop the services first.
+    """
+    actual = {}
+    async for w in db.pending_withdrawals.find({"status": {"$in": OPEN_WITHDRAWAL_STATUSES}}):
+        totals = actual.setdefault(w["sender"], {})
+        totals[str(w["asset_id"])] = totals.get(str(w["asset_id"]), 0) + int(w["value"])
+        totals["0"] = totals.get("0", 0) + int(w["fee"])
+
+    batch = LedgerBatch()
+    ref = f"reconcile-{int(datetime.datetime.utcnow().timestamp())}"
+    async for address in db.addresses.find({"balance.pending": {"$exists": True}}, {"balance.pending": 1}):
+        actual.setdefault(address["_id"], {})
+        for asset_id, amount in address["balance"]["pending"].items():
+            actual[address["_id"]][asset_id] = actual[address["_id"]].get(asset_id, 0) - int(amount)
+
+    for address, totals in actual.items():
+        for asset_id, difference in totals.items():
+            if difference:
+                batch.add(ref, "pending_fix", address, asset_id, pending_delta=difference)
+    await batch.write()
+    await batch.apply()
+    print(f"✅ Corrected {len(batch)} open withdrawal totals.")
+
+
+async def _latest_snapshots(addresses, cutoff):
+    """Latest committed snapshot balance per address."""
+    if cutoff is None:
+        return {}
+    latest = {}
+    query = {"address": {"$in": addresses}, "cutoff": {"$lte": cutoff}}
+    async for snapshot in db.ledger_snapshots.find(query).sort("cutoff", 1):
+        latest[snapshot["address"]] = snapshot["balance"]
+    return latest
+
+
+async def rebuild_balances(addresses=None):
+    """
+    Recompute address balances from the latest snapshot plus all later ledger entries.
+
+    Marks all ledger entries of the rebuilt addresses as applied. Run while the services are stopped.
+
+    :param addresses: Addresses to rebuild, all addresses if None.
+    """
+    cutoff = await _snapshot_cutoff()
+    if addresses is None:
+        addresses = [a["_id"] async for a in db.addresses.find({}, {"_id": 1})]
+
+    rebuilt = 0
+    for i in range(0, len(addresses), 1000):
+        chunk = addresses[i:i + 1000]
+        balances = await _latest_snapshots(chunk, cutoff)
+        query = {"address": {"$in": chunk}}
+        if cutoff:
+            query["created"] = {"$gte": cutoff}
+        async for e in db.ledger.find(query):
+            _add_amounts(balances.setdefault(e["address"], {}), e["asset_id"], e)
+
+        ops = [
+            UpdateOne({"_id": address}, {"$set": {"balance": _complete(balances.get(address, {}))}})
+            for address in chunk
+        ]
+        await db.addresses.bulk_write(ops, ordered=False)
+        await db.ledger.update_many({"address": {"$in": chunk}, "applied": {"$ne": True}}, {"$set": {"applied": True}})
+        rebuilt += len(chunk)
+
+    await reset_totals()
+    print(f"✅ Rebuilt balances of {rebuilt} addresses from the ledger.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeamPay balance ledger")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("open", help="Record opening entries for existing balances")
+    commands.add_parser("reconcile-pending", help="Correct open withdrawal totals from the withdrawal queue")
+    commands.add_parser("snapshot", help="Fold ledger entries into snapshots")
+    commands.add_parser("recount-totals", help="Reset the running balance totals to a full recount")
+    rebuild = commands.add_parser("rebuild", help="Recompute balances from the ledger")
+    rebuild.add_argument("--address", action="append", help="Only rebuild this address (repeatable)")
+    history = commands.add_parser("history", help="Show the ledger entries of an address")
+    history.add_argument("address")
+    history.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == "open":
+        asyncio.run(open_ledger())
+    elif args.command == "reconcile-pending":
+        asyncio.run(reconcile_pending())
+    elif args.command == "snapshot":
+        asyncio.run(take_snapshots(min_interval=0))
+    elif args.command == "recount-totals":
+        totals = asyncio.run(reset_totals())
+        print(f"✅ Recounted balance totals of {len(totals)} assets.")
+    elif args.command == "rebuild":
+        asyncio.run(rebuild_balances(args.address))
+    elif args.command == "history":
+        for entry in asyncio.run(address_history(args.address, limit=args.limit)):
+            print(f"{entry['created']}  {entry['effect']:<14} {entry['asset_id']:>5}  "
+                  f"available {int(entry['available']):+}  locked {int(entry['locked']):+}  "
+                  f"pending {int(entry.get('pending', 0)):+}  ({entry['ref']})")
@@ -0,0 +1,96 @@
+import bisect
+import hashlib
+import heapq
+import sys
+import time
+from array import array
+
+
+def address_key(address):
+    """64-bit key of an address (first 8 bytes of its BLAKE2b hash)."""
+    return int.from_bytes(hashlib.blake2b(address.encode(), digest_size=8).digest(), "big")
+
+
+class AddressIndex:
+    def __init__(self, merge_threshold=10000, refresh_overlap=60):
+        """
+        Process-local membership index of our own addresses.
+
+        Addresses are kept as a sorted array of 64-bit keys (8 bytes per address) plus a small set
+        of recent additions that is merged into the array once it grows past `merge_threshold`.
+        A false positive needs a 64-bit hash collision and is harmless: updates of a foreign
+        address match no document.
+
+        :param merge_threshold: Recent additions kept in the set before merging into the array.
+        :param refresh_overlap: Seconds re-read on refresh to tolerate clock skew between processes.
+        """
+        self.keys = array("Q")
+        self.recent = set()
+        self.merge_threshold = merge_threshold
+        self.refresh_overlap = refresh_overlap
+        self.refreshed_at = None
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.keys) + len(self.recent)
+
+    def __contains__(self, address):
+        return self._has_key(address_key(address))
+
+    def _has_key(self, key):
+        if key in self.recent:
+            return True
+        i = bisect.bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def add(self, address):
+        key = address_key(address)
+        if self._has_key(key):
+            return
+        self.recent.add(key)
+        if len(self.recent) >= self.merge_threshold:
+            self._merge()
+
+    def _merge(self):
+        self.keys = array("Q", heapq.merge(self.keys, sorted(self.recent)))
+        self.recent = set()
+
+    async def load(self, collection):
+        """
+        Load all addresses of a collection (`_id` is the address).
+
+        :param collection: Motor collection, e.g. db.addresses.
+        """
+        started = time.time()
+        keys = array("Q")
+        async for doc in collection.find({}, {"_id": 1}):
+            keys.append(address_key(doc["_id"]))
+        self.keys = array("Q", sorted(keys))
+        self.recent = set()
+        self.refreshed_at = started
+        self.loaded = True
+
+    async def refresh(self, collection):
+        """
+        Add addresses inserted by other processes since the last refresh (by their `added` time.time() timestamp).
+
+        Loads the whole collection on first use.
+        """
+        if not self.loaded:
+            await self.load(collection)
+            return
+        started = time.time()
+        query = {"added": {"$gte": self.refreshed_at - self.refresh_overlap}}
+        async for doc in collection.find(query, {"_id": 1}):
+            self.add(doc["_id"])
+        self.refreshed_at = started
+
+    def stats(self):
+        """
+        Size and approximate memory use of the index.
+        """
+        return {
+            "addresses": len(self),
+            "recent": len(self.recent),
+            "memory_bytes": self.keys.itemsize * len(self.keys) + sys.getsizeof(self.recent),
+        }
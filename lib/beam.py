@@ -1,17 +1,263 @@
+import asyncio
+import contextlib
+import contextvars
+import copy
+import threading
+import time
 import requests
+import aiohttp
 import json
+from collections import OrderedDict, deque
+
+
+class BEAMWalletAPIError(Exception):
+    def __init__(self, code, message):
+        """
+        Error returned by the BEAM Wallet API for a single JSON-RPC call.
+
+        :param code: JSON-RPC error code (None for transport-level problems).
+        :param message: Human readable error message.
+        """
+        super().__init__(f"Error {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class WalletBusyError(BEAMWalletAPIError):
+    def __init__(self, lane):
+        """
+        Raised when a governor lane queue is full (backpressure).
+
+        :param lane: The lane that rejected the call.
+        """
+        super().__init__(None, f"Wallet API busy: '{lane}' queue is full")
+        self.lane = lane
+
+
+# Priority lane of the current task, see AsyncBEAMWalletAPI.priority()
+_wallet_lane = contextvars.ContextVar("wallet_lane", default=None)
+
+
+class WalletGovernor:
+    LANES = ("withdrawal", "tx_sync", "assets", "admin")  # Highest priority first
+
+    def __init__(self, max_in_flight=8, max_queue=1000):
+        """
+        Cap the number of in-flight wallet RPCs and hand out free slots by lane priority.
+
+        Callers above the cap wait in the queue of their lane; a freed slot always goes to the
+        oldest waiter of the highest priority lane. When a lane queue holds `max_queue` waiters,
+        new calls on that lane fail fast with WalletBusyError.
+
+        :param max_in_flight: Maximum number of simultaneous RPCs.
+        :param max_queue: Maximum number of waiting calls per lane.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters = {lane: deque() for lane in self.LANES}
+        self.lane_stats = {
+            lane: {"calls": 0, "queued": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in self.LANES
+        }
+
+    async def acquire(self, lane):
+        """
+        Wait for a free slot on the given lane.
+        """
+        if lane not in self.waiters:
+            raise ValueError(f"Unknown wallet API lane: {lane}")
+
+        stats = self.lane_stats[lane]
+        started = time.monotonic()
+        if self.in_flight < self.max_in_flight and not any(self.waiters.values()):
+            self.in_flight += 1
+        else:
+            queue = self.waiters[lane]
+            if len(queue) >= self.max_queue:
+                stats["rejected"] += 1
+                raise WalletBusyError(lane)
+
+            future = asyncio.get_running_loop().create_future()
+            queue.append(future)
+            stats["queued"] += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release()  # The slot was handed over right before cancellation
+                elif future in queue:
+                    queue.remove(future)
+                raise
+
+        waited = time.monotonic() - started
+        stats["calls"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+
+    def release(self):
+        """
+        Free a slot, handing it directly to the highest priority waiter if any.
+        """
+        for lane in self.LANES:
+            queue = self.waiters[lane]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, lane):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        In-flight count, current queue depth and wait times per lane.
+        """
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "lanes": {
+                lane: {
+                    "depth": len(self.waiters[lane]),
+                    "calls": stats["calls"],
+                    "queued": stats["queued"],
+                    "rejected": stats["rejected"],
+                    "wait_avg": round(stats["wait_total"] / stats["calls"], 4) if stats["calls"] else 0,
+                    "wait_max": round(stats["wait_max"], 4),
+                }
+                for lane, stats in self.lane_stats.items()
+            },
+        }
+
+
+class WalletResponseCache:
+    # method: (TTL in seconds or None to keep until evicted, drop when current_height advances)
+    DEFAULT_POLICIES = {
+        'block_details': (None, False),  # A block at a given height never changes
+        'validate_address': (3600, False),
+        'get_asset_info': (300, True),
+        'wallet_status': (10, True),
+    }
+
+    def __init__(self, max_size=10000, policies=None):
+        """
+        Bounded LRU cache for read-only wallet RPC responses.
+
+        Only methods listed in the policies are cached. Entries of per-block methods are
+        invalidated as soon as a newer `current_height` is observed in a wallet_status response.
+        Values are copied in and out, so callers may modify what they get.
+
+        :param max_size: Maximum number of cached responses.
+        :param policies: Optional overrides of DEFAULT_POLICIES, e.g. {'get_asset_info': (60, True)}.
+        """
+        self.max_size = max_size
+        self.policies = dict(self.DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.entries = OrderedDict()  # (method, params) -> (value, expires_at, height)
+        self.height = None
+        self.hits = 0
+        self.misses = 0
+        self.method_stats = {}  # method -> {"hits": n, "misses": n}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(method, params):
+        return method, json.dumps(params, sort_keys=True)
+
+    def _count(self, method, field):
+        setattr(self, field, getattr(self, field) + 1)
+        stats = self.method_stats.setdefault(method, {"hits": 0, "misses": 0})
+        stats[field] += 1
+
+    def get(self, method, params):
+        """
+        Look up a cached response.
+
+        :return: (True, value) on a hit, (False, None) otherwise.
+        """
+        if method not in self.policies:
+            return False, None
+
+        key = self._key(method, params)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at, height = entry
+                per_block = self.policies[method][1]
+                if (expires_at is None or expires_at > time.monotonic()) and not (per_block and height != self.height):
+                    self.entries.move_to_end(key)
+                    self._count(method, "hits")
+                    return True, copy.deepcopy(value)
+                del self.entries[key]
+            self._count(method, "misses")
+        return False, None
+
+    def set(self, method, params, value):
+        """
+        Store a response if the method is cacheable.
+        """
+        if method == 'wallet_status' and isinstance(value, dict) and 'current_height' in value:
+            self.observe_height(value['current_height'])
+        if method not in self.policies or value is None:
+            return
+
+        ttl = self.policies[method][0]
+        with self._lock:
+            key = self._key(method, params)
+            self.entries[key] = (copy.deepcopy(value), time.monotonic() + ttl if ttl else None, self.height)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def observe_height(self, height):
+        """
+        Record the current chain height. Per-block entries cached at an older height become stale.
+        """
+        if height is not None and (self.height is None or height > self.height):
+            self.height = height
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters, overall and per method.
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "height": self.height,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0,
+            "methods": {m: dict(v) for m, v in self.method_stats.items()},
+        }
+
 
 class BEAMWalletAPI:
-    def __init__(self, api_url):
+    def __init__(self, api_url, cache=None, recorder=None):
         """
         Initialize the BEAM Wallet API client.
 
         :param api_url: The full URL to the BEAM Wallet API (e.g., 'http://127.0.0.1:10000')
+        :param cache: Optional WalletResponseCache for read-only calls.
+        :param recorder: Optional WalletRecorder (lib/wallet_recording.py) capturing every request/response.
         """
         self.api_url = api_url
+        self.cache = cache
+        self.recorder = recorder
         self.headers = {
             'Content-Type': 'application/json',
         }
+        self.session = requests.Session()  # Reuse keep-alive connections between calls
 
     def _post(self, method, params=None):
         """
@@ -27,20 +273,133 @@ class BEAMWalletAPI:
             'method': method,
             'params': params or {}
         }
+        if self.cache is not None:
+            found, value = self.cache.get(method, payload['params'])
+            if found:
+                return value
 
+        started = time.time()
         try:
-            response = requests.post(self.api_url, headers=self.headers, data=json.dumps(payload))
+            response = self.session.post(self.api_url, headers=self.headers, data=json.dumps(payload))
             response.raise_for_status()  # Raise an exception for HTTP errors
-            result = response.json()
-            if 'error' in result:
-                raise Exception(f"Error {result['error']['code']}: {result['error']['message']}")
-            if "result" in result:
-                return result.get('result')
-            elif "assets" in result:
-                return result['assets']
+            result = self._unpack(response.json())
+        except BEAMWalletAPIError as e:
+            self._record(method, payload['params'], started, e)
+            raise
         except requests.exceptions.RequestException as e:
             raise Exception(f"HTTP Request failed: {e}")
 
+        self._record(method, payload['params'], started, result)
+        if self.cache is not None:
+            self.cache.set(method, payload['params'], result)
+        return result
+
+    def _record(self, method, params, started, result):
+        """
+        Pass a completed call to the recorder, if recording is enabled.
+
+        :param started: Unix time at which the request was sent.
+        :param result: The call result, or the BEAMWalletAPIError it failed with.
+        """
+        if self.recorder is not None:
+            self.recorder.record(method, params, result, started=started, elapsed=time.time() - started)
+
+    @staticmethod
+    def _unpack(result):
+        """
+        Extract the payload of a single JSON-RPC response.
+
+        :param result: The decoded JSON-RPC response object.
+        :return: The 'result' field (or 'assets' for legacy responses).
+        """
+        if 'error' in result:
+            raise BEAMWalletAPIError(result['error'].get('code'), result['error'].get('message'))
+        if "result" in result:
+            return result.get('result')
+        elif "assets" in result:
+            return result['assets']
+
+    @staticmethod
+    def _batch_payload(calls):
+        """
+        Build a JSON-RPC batch request with a unique id per call.
+
+        :param calls: List of (method, params) tuples.
+        :return: List of JSON-RPC request objects.
+        """
+        return [
+            {'jsonrpc': '2.0', 'id': i + 1, 'method': method, 'params': params}
+            for i, (method, params) in enumerate(calls)
+        ]
+
+    @classmethod
+    def _unpack_batch(cls, payload, responses):
+        """
+        Match batch responses back to their requests by id.
+
+        :param payload: The JSON-RPC batch request that was sent.
+        :param responses: The decoded batch response.
+        :return: List of results in request order; failed calls are returned as BEAMWalletAPIError.
+        """
+        if isinstance(responses, dict):
+            # The whole batch was rejected with a single error object
+            error = responses.get('error') or {'code': None, 'message': 'Unexpected batch response'}
+            return [BEAMWalletAPIError(error.get('code'), error.get('message')) for _ in payload]
+
+        by_id = {r.get('id'): r for r in responses if isinstance(r, dict)}
+        results = []
+        for request in payload:
+            response = by_id.get(request['id'])
+            if response is None:
+                results.append(BEAMWalletAPIError(None, f"No response for {request['method']}"))
+                continue
+            try:
+                results.append(cls._unpack(response))
+            except BEAMWalletAPIError as e:
+                results.append(e)
+        return results
+
+    def _post_batch(self, calls, max_size=100, concurrency=1):
+        """
+        Send many JSON-RPC calls as batch requests of up to `max_size` calls each.
+
+        :param calls: List of (method, params) tuples.
+        :param max_size: Maximum number of calls per HTTP request.
+        :param concurrency: Ignored; the blocking client sends one request at a time.
+        :return: List of results in call order; failed calls are returned as BEAMWalletAPIError.
+        """
+        results = []
+        for start in range(0, len(calls), max_size):
+            chunk = calls[start:start + max_size]
+            payload = self._batch_payload(chunk)
+            started = time.time()
+            try:
+                response = self.session.post(self.api_url, headers=self.headers, data=json.dumps(payload))
+                response.raise_for_status()  # Raise an exception for HTTP errors
+                chunk_results = self._unpack_batch(payload, response.json())
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"HTTP Request failed: {e}")
+            for (method, params), result in zip(chunk, chunk_results):
+                self._record(method, params, started, result)
+            results.extend(chunk_results)
+        return results
+
+    def batch(self, max_size=100, concurrency=1):
+        """
+        Start collecting calls to be sent as JSON-RPC batch requests.
+
+        Usage:
+            batch = beam_api.batch()
+            for tx_id in tx_ids:
+                batch.tx_status(tx_id)
+            results = batch.execute()  # `await batch.execute()` for AsyncBEAMWalletAPI
+
+        :param max_size: Maximum number of calls per HTTP request.
+        :param concurrency: Maximum number of batch requests in flight (AsyncBEAMWalletAPI only).
+        :return: A WalletBatch with the same methods as the client.
+        """
+        return WalletBatch(self, max_size, concurrency)
+
     def create_address(self, label=None, wallet_type="regular", expiration='never', use_default_signature=False):
         """
         Create a new payment address.
@@ -387,3 +746,365 @@ class BEAMWalletAPI:
         return self._post('process_invoke_data', params)
 
 
+class WalletBatch(BEAMWalletAPI):
+    def __init__(self, api, max_size=100, concurrency=1):
+        """
+        Collector for batched wallet calls.
+
+        Every wallet method only records the call and returns its index in the batch.
+
+        :param api: The BEAMWalletAPI or AsyncBEAMWalletAPI client that will send the batch.
+        :param max_size: Maximum number of calls per HTTP request.
+        :param concurrency: Maximum number of batch requests in flight.
+        """
+        self.api = api
+        self.max_size = max_size
+        self.concurrency = concurrency
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def _post(self, method, params=None):
+        self.calls.append((method, params or {}))
+        return len(self.calls) - 1
+
+    def execute(self):
+        """
+        Send all collected calls.
+
+        :return: List of results in call order (awaitable for AsyncBEAMWalletAPI).
+                 Failed calls are returned as BEAMWalletAPIError instead of raising.
+        """
+        return self.api._post_batch(self.calls, self.max_size, self.concurrency)
+
+
+class AsyncBEAMWalletAPI(BEAMWalletAPI):
+    # Methods that always run on a fixed lane, whatever the caller's priority
+    METHOD_LANES = {
+        'tx_send': 'withdrawal',
+    }
+
+    def __init__(self, api_url, pool_size=20, timeout=30, timeouts=None, cache=None, governor=None, default_lane="admin", recorder=None, ws_url=None):
+        """
+        Initialize the asynchronous BEAM Wallet API client.
+
+        Exposes the same methods as BEAMWalletAPI, but every call returns an awaitable and
+        all calls share one keep-alive connection pool, so a slow RPC never blocks the event loop.
+
+        :param api_url: The full URL to the BEAM Wallet API (e.g., 'http://127.0.0.1:10000')
+        :param pool_size: Maximum number of simultaneous connections to the wallet API.
+        :param timeout: Default timeout in seconds for a single RPC call.
+        :param timeouts: Optional per-method timeout overrides (e.g., {'get_utxo': 120}).
+        :param cache: Optional WalletResponseCache for read-only calls.
+        :param governor: Optional WalletGovernor limiting in-flight calls by priority lane.
+        :param default_lane: Lane used for calls made outside of a `priority()` block.
+        :param recorder: Optional WalletRecorder (lib/wallet_recording.py) capturing every request/response.
+        :param ws_url: Optional WebSocket URL of the wallet API (e.g., 'ws://127.0.0.1:10001'), used by events().
+        """
+        super().__init__(api_url, cache=cache, recorder=recorder)
+        self.ws_url = ws_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.governor = governor
+        self.default_lane = default_lane
+        self._session = None
+
+    @contextlib.contextmanager
+    def priority(self, lane):
+        """
+        Run wallet calls made inside the block (and tasks started from it) on the given lane.
+
+        Usage:
+            with beam_api.priority("assets"):
+                assets = await beam_api.assets_list(refresh=True)
+
+        :param lane: One of WalletGovernor.LANES.
+        """
+        token = _wallet_lane.set(lane)
+        try:
+            yield
+        finally:
+            _wallet_lane.reset(token)
+
+    def _slot(self, method):
+        """
+        Governor slot for a call, or a no-op context when no governor is configured.
+        """
+        if self.governor is None:
+            return contextlib.nullcontext()
+        return self.governor.slot(self.METHOD_LANES.get(method) or _wallet_lane.get() or self.default_lane)
+
+    def _get_session(self):
+        """
+        Return the shared aiohttp session, creating it on first use inside the running loop.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self._session
+
+    async def close(self):
+        """
+        Close the connection pool and the recorder, if any.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.recorder is not None:
+            self.recorder.close()
+
+    async def _post(self, method, params=None, stats=None):
+        """
+        Send a JSON-RPC request to the BEAM Wallet API without blocking the event loop.
+
+        :param method: The API method to call (e.g., 'create_address').
+        :param params: A dictionary of parameters for the API call.
+        :param stats: Optional dict that receives the request 'elapsed' time and response 'bytes'.
+        :return: The 'result' field from the API response.
+        """
+        payload = {
+            'jsonrpc': '2.0',
+            'id': 1,
+            'method': method,
+            'params': params or {}
+        }
+        if self.cache is not None:
+            found, value = self.cache.get(method, payload['params'])
+            if found:
+                return value
+        timeout = aiohttp.ClientTimeout(total=self.timeouts.get(method, self.timeout))
+
+        try:
+            async with self._slot(method):
+                started = time.time()
+                async with self._get_session().post(self.api_url, data=json.dumps(payload), timeout=timeout) as response:
+                    response.raise_for_status()  # Raise an exception for HTTP errors
+                    body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise Exception(f"HTTP Request failed: {e!r}")
+
+        try:
+            result = self._unpack(json.loads(body))
+        except BEAMWalletAPIError as e:
+            self._record(method, payload['params'], started, e)
+            raise
+        self._record(method, payload['params'], started, result)
+        if stats is not None:
+            stats.update(elapsed=time.time() - started, bytes=len(body))
+        if self.cache is not None:
+            self.cache.set(method, payload['params'], result)
+        return result
+
+    async def _post_batch(self, calls, max_size=100, concurrency=1):
+        """
+        Send many JSON-RPC calls as batch requests of up to `max_size` calls each.
+
+        :param calls: List of (method, params) tuples.
+        :param max_size: Maximum number of calls per HTTP request.
+        :param concurrency: Maximum number of batch requests in flight.
+        :return: List of results in call order; failed calls are returned as BEAMWalletAPIError.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(chunk):
+            payload = self._batch_payload(chunk)
+            timeout = aiohttp.ClientTimeout(total=max(self.timeouts.get(method, self.timeout) for method, _ in chunk))
+            async with semaphore:
+                started = time.time()
+                try:
+                    async with self._slot(chunk[0][0]), self._get_session().post(self.api_url, data=json.dumps(payload), timeout=timeout) as response:
+                        response.raise_for_status()  # Raise an exception for HTTP errors
+                        chunk_results = self._unpack_batch(payload, await response.json(content_type=None))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise Exception(f"HTTP Request failed: {e!r}")
+            for (method, params), result in zip(chunk, chunk_results):
+                self._record(method, params, started, result)
+            return chunk_results
+
+        chunks = [calls[start:start + max_size] for start in range(0, len(calls), max_size)]
+        results = []
+        for chunk_results in await asyncio.gather(*(send(chunk) for chunk in chunks)):
+            results.extend(chunk_results)
+        return results
+
+    async def _pages(self, method, params, page_size=100, prefetch=True, adaptive=True):
+        """
+        Page through a skip/count wallet method.
+
+        :param method: The API method to call (e.g., 'tx_list').
+        :param params: Method parameters without 'skip' and 'count'.
+        :param page_size: Initial number of items per page.
+        :param prefetch: If True, the next page is requested while the current one is processed.
+        :param adaptive: If True, the page size follows response latency and payload size.
+        :return: Async generator of non-empty pages (lists). Consumers that may leave the loop
+                 early should close it (contextlib.aclosing), which cancels the prefetched request.
+        """
+        sizer = PageSizer(page_size) if adaptive else PageSizer(page_size, min_size=page_size, max_size=page_size)
+
+        async def fetch(skip, count):
+            stats = {}
+            page = await self._post(method, dict(params, skip=skip, count=count), stats=stats)
+            return page or [], count, stats
+
+        skip = 0
+        pending = asyncio.ensure_future(fetch(skip, sizer.size))
+        try:
+            while pending is not None:
+                page, count, stats = await pending
+                pending = None
+                if not page:
+                    return
+                sizer.update(stats.get("elapsed", 0), stats.get("bytes", 0))
+                skip += len(page)
+                is_last = len(page) < count
+                if prefetch and not is_last:
+                    pending = asyncio.ensure_future(fetch(skip, sizer.size))
+                yield page
+                if not prefetch and not is_last:
+                    pending = asyncio.ensure_future(fetch(skip, sizer.size))
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    async def events(self, txs=True, utxos=True, addresses=False, system_state=True, reconnect_delay=5, max_reconnect_delay=300, heartbeat=30):
+        """
+        Subscribe to wallet change events (ev_subunsub) and yield them as they arrive.
+
+        The connection is re-opened after errors, including a refused subscription or a malformed
+        message; the delay doubles (up to `max_reconnect_delay`) while no event comes through.
+        Events sent while it was down are lost, so a ('connected', None) marker is yielded after
+        every (re)connect and ('disconnected', error) when it drops; consumers should catch up with
+        a regular poll on 'connected'.
+
+        Usage:
+            async for event, result in beam_api.events():
+                if event == "ev_txs_changed":
+                    for tx in result["txs"]: ...
+
+        :param txs: Subscribe to ev_txs_changed.
+        :param utxos: Subscribe to ev_utxos_changed.
+        :param addresses: Subscribe to ev_addrs_changed.
+        :param system_state: Subscribe to ev_system_state (new blocks).
+        :param reconnect_delay: Seconds to wait before reconnecting.
+        :param max_reconnect_delay: Max seconds between reconnects after repeated failures.
+        :param heartbeat: Seconds between WebSocket pings; a missed pong drops the connection.
+        :return: Async generator of (event, result) tuples.
+        """
+        if not self.ws_url:
+            raise Exception("Wallet API WebSocket URL is not configured")
+        subscribe = {
+            'jsonrpc': '2.0',
+            'id': 'subscribe',
+            'method': 'ev_subunsub',
+            'params': {
+                'ev_txs_changed': txs,
+                'ev_utxos_changed': utxos,
+                'ev_addrs_changed': addresses,
+                'ev_system_state': system_state,
+            }
+        }
+
+        delay = reconnect_delay
+        while True:
+            error = None
+            try:
+                async with self._get_session().ws_connect(self.ws_url, heartbeat=heartbeat) as ws:
+                    await ws.send_str(json.dumps(subscribe))
+                    yield 'connected', None
+                    async for message in ws:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        data = json.loads(message.data)
+                        if data.get('id') == 'subscribe':
+                            self._unpack(data)  # Raise BEAMWalletAPIError if the wallet refused
+                        elif str(data.get('id', '')).startswith('ev_'):
+                            delay = reconnect_delay
+                            yield data['id'], data.get('result') or {}
+                    error = ws.exception()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, BEAMWalletAPIError, ValueError) as e:
+                error = e  # ValueError: malformed JSON message
+            yield 'disconnected', error
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+    def tx_list_pages(self, filter=None, page_size=100, prefetch=True):
+        """
+        Iterate over the wallet's transactions page by page (newest first).
+
+        Usage:
+            async with contextlib.aclosing(beam_api.tx_list_pages()) as pages:
+                async for page in pages:
+                    for tx in page: ...
+
+        :param filter: Optional tx_list filter (e.g., {'status': 3}).
+        :param page_size: Initial number of transactions per page.
+        :param prefetch: If True, the next page is requested while the current one is processed.
+        :return: Async generator of transaction lists.
+        """
+        params = {"filter": filter} if filter else {}
+        return self._pages('tx_list', params, page_size=page_size, prefetch=prefetch)
+
+    def get_utxo_pages(self, filter=None, sort_field="amount", sort_direction="asc", page_size=500, prefetch=True):
+        """
+        Iterate over all UTXOs page by page.
+
+        :param filter: Optional UTXO filter (e.g., {'asset_id': 0}).
+        :param sort_field: Field to sort by (e.g., 'amount', 'asset_id').
+        :param sort_direction: Sorting direction ('asc' or 'desc').
+        :param page_size: Initial number of UTXOs per page.
+        :param prefetch: If True, the next page is requested while the current one is processed.
+        :return: Async generator of UTXO lists.
+        """
+        params = {
+            "sort": {
+                "field": sort_field,
+                "direction": sort_direction
+            },
+            "assets": True,
+            "filter": filter or {},
+        }
+        return self._pages('get_utxo', params, page_size=page_size, prefetch=prefetch)
+
+    async def addr_list_pages(self, own=True, page_size=1000):
+        """
+        Iterate over wallet addresses in pages.
+
+        addr_list has no server-side paging, so the list is fetched once and handed out in
+        slices; callers can still process (and write) one bounded page at a time.
+
+        :param own: If True, returns only own addresses. If False, returns peer addresses.
+        :param page_size: Number of addresses per page.
+        :return: Async generator of address lists.
+        """
+        addresses = await self.addr_list(own=own) or []
+        for start in range(0, len(addresses), page_size):
+            yield addresses[start:start + page_size]
+
+
+class PageSizer:
+    def __init__(self, size=100, min_size=20, max_size=5000, target_latency=1.0, max_bytes=4 * 1024 * 1024):
+        """
+        Adapt the page size of paged wallet calls to response latency and payload size.
+
+        The size doubles while responses are fast and small, and halves when a response is
+        slower than 1.5x `target_latency` or larger than `max_bytes`.
+
+        :param size: Initial page size.
+        :param min_size: Smallest page size.
+        :param max_size: Largest page size.
+        :param target_latency: Desired response time in seconds.
+        :param max_bytes: Largest desired response body in bytes.
+        """
+        self.size = max(min_size, min(size, max_size))
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+
+    def update(self, elapsed, nbytes):
+        if elapsed > self.target_latency * 1.5 or nbytes > self.max_bytes:
+            self.size = max(self.min_size, self.size // 2)
+        elif elapsed < self.target_latency / 2 and nbytes < self.max_bytes / 2:
+            self.size = min(self.max_size, self.size * 2)
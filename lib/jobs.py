@@ -0,0 +1,131 @@
+import asyncio
+import random
+import time
+import traceback
+
+
+class Job:
+    def __init__(self, name, fn, interval, jitter=0.1, timeout=None, wake=None, lease=None):
+        """
+        A periodic job of a JobScheduler.
+
+        :param name: Job name, used in logs and stats.
+        :param fn: Coroutine function run by the job.
+        :param interval: Seconds from the end of one run to the start of the next, or a callable returning them.
+        :param jitter: Random fraction added to or taken from the interval, so jobs don't run in lockstep.
+        :param timeout: Seconds after which a run is cancelled (None = no limit).
+        :param wake: Optional asyncio.Event that starts the next run early when set.
+        :param lease: Optional lease (see leases.py); runs are skipped while it isn't held.
+        """
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.wake = wake
+        self.lease = lease
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.running = False
+        self.due = None  # Unix time the next run is due
+        self.last_started = None
+        self.last_duration = None
+        self.last_lag = None  # Seconds the last run started after it was due
+        self.last_error = None
+
+    def next_delay(self):
+        interval = self.interval() if callable(self.interval) else self.interval
+        return max(0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "running": self.running,
+            "last_started": self.last_started,
+            "last_duration": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_lag": round(self.last_lag, 3) if self.last_lag is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class JobScheduler:
+    def __init__(self, on_error=None):
+        """
+        Runs periodic jobs, each in its own task.
+
+        A job's next run starts only after its previous run finished, so runs of the same job
+        never overlap, while a slow job doesn't delay the others. Failures and timeouts are
+        logged and counted; the job runs again at its next interval.
+
+        :param on_error: Optional coroutine function called with (job name, traceback text) on failures.
+        """
+        self.jobs = {}
+        self.on_error = on_error
+
+    def add(self, name, fn, interval, jitter=0.1, timeout=None, wake=None, lease=None):
+        """
+        Register a job; see Job for the parameters.
+
+        :return: The Job.
+        """
+        job = Job(name, fn, interval, jitter=jitter, timeout=timeout, wake=wake, lease=lease)
+        self.jobs[name] = job
+        return job
+
+    async def _wait(self, job):
+        delay = job.due - time.time()
+        if job.wake is None:
+            await asyncio.sleep(delay)
+            return
+        try:
+            await asyncio.wait_for(job.wake.wait(), max(0, delay))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _loop(self, job):
+        job.due = time.time()
+        while True:
+            await self._wait(job)
+            if job.wake is not None:
+                job.wake.clear()
+            if job.lease is not None and not job.lease.held:
+                job.skipped += 1  # Another worker runs this job
+                job.due = time.time() + job.next_delay()
+                continue
+            started = time.time()
+            job.last_started = started
+            job.last_lag = max(0, started - job.due)
+            job.running = True
+            try:
+                await asyncio.wait_for(job.fn(), job.timeout)
+                job.last_error = None
+            except asyncio.TimeoutError:
+                job.timeouts += 1
+                job.last_error = f"Timed out after {job.timeout}s"
+                print(f"⏰ Job {job.name} timed out after {job.timeout}s")
+            except Exception as exc:
+                job.failures += 1
+                job.last_error = repr(exc)
+                traceback.print_exc()
+                if self.on_error is not None:
+                    await self.on_error(job.name, traceback.format_exc())
+            finally:
+                job.running = False
+                job.runs += 1
+                job.last_duration = time.time() - started
+            job.due = time.time() + job.next_delay()
+
+    async def run(self):
+        """Run all jobs until cancelled."""
+        await asyncio.gather(*(self._loop(job) for job in self.jobs.values()))
+
+    def stats(self):
+        """
+        Runs, failures, last duration and lag per job.
+        """
+        return {name: job.stats() for name, job in self.jobs.items()}
@@ -0,0 +1,53 @@
+import asyncio
+
+
+class KeyedExecutor:
+    def __init__(self, workers=8):
+        """
+        Run coroutines concurrently while keeping them in submission order per key.
+
+        A job waits for the previously submitted job of each of its keys (e.g. the sender and
+        receiver address of a tx) and then for one of `workers` slots. Jobs without shared
+        keys run in parallel.
+
+        :param workers: Max jobs running at the same time.
+        """
+        self.workers = workers
+        self.semaphore = asyncio.Semaphore(workers)
+        self.tails = {}  # key -> last submitted job with that key
+        self.jobs = []
+
+    def submit(self, keys, fn, *args):
+        """
+        Schedule `fn(*args)` after all earlier jobs sharing one of `keys`.
+
+        :return: The job's task.
+        """
+        keys = set(keys)
+        previous = {self.tails[key] for key in keys if key in self.tails}
+        job = asyncio.ensure_future(self._run(previous, fn, args))
+        for key in keys:
+            self.tails[key] = job
+        job.add_done_callback(lambda _: self._release(keys, job))
+        self.jobs.append(job)
+        return job
+
+    async def _run(self, previous, fn, args):
+        if previous:
+            await asyncio.wait(previous)  # Order only; failures of earlier jobs don't propagate
+        async with self.semaphore:
+            return await fn(*args)
+
+    def _release(self, keys, job):
+        for key in keys:
+            if self.tails.get(key) is job:
+                del self.tails[key]
+
+    async def join(self):
+        """
+        Wait for all submitted jobs.
+
+        :return: Results in submission order (exceptions are returned, not raised).
+        """
+        jobs, self.jobs = self.jobs, []
+        return await asyncio.gather(*jobs, return_exceptions=True)
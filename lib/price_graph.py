@@ -0,0 +1,63 @@
+import heapq
+import math
+
+
+class PriceGraph:
+    def __init__(self, pools):
+        """
+        Exchange graph of DEX liquidity pools.
+
+        Every pool of a `pools_view` response is an edge in both directions. `k1_2` is the price
+        of aid2 in aid1 units and `k2_1` the reverse (the reserve ratio is used if they are missing).
+        Of several pools for the same pair, the deepest (largest tok1 * tok2) sets the pair rate.
+
+        :param pools: `res` list of the DEX pools_view output.
+        """
+        self.edges = {}  # asset_id -> [(other asset_id, price of other in asset_id units, reserve of asset_id)]
+        self.pairs = {}  # (aid1, aid2) -> pool with the most liquidity
+        for pool in pools:
+            aid1, aid2 = str(pool["aid1"]), str(pool["aid2"])
+            tok1, tok2 = float(pool.get("tok1", 0)), float(pool.get("tok2", 0))
+            if tok1 <= 0 or tok2 <= 0:
+                continue  # Empty pool, no price
+            rate1_2 = float(pool.get("k1_2") or tok1 / tok2)
+            rate2_1 = float(pool.get("k2_1") or tok2 / tok1)
+            self.edges.setdefault(aid1, []).append((aid2, rate1_2, tok1))
+            self.edges.setdefault(aid2, []).append((aid1, rate2_1, tok2))
+
+            best = self.pairs.get((aid1, aid2))
+            if best is None or tok1 * tok2 > float(best["tok1"]) * float(best["tok2"]):
+                self.pairs[(aid1, aid2)] = pool
+
+    def assets(self):
+        return set(self.edges)
+
+    def prices(self, base="0"):
+        """
+        Price of every asset reachable from `base`, in `base` units.
+
+        Routes are chosen by liquidity: of all paths, the one whose shallowest pool holds the
+        most value (widest-path Dijkstra, one pass over the graph). A pool's depth is twice its
+        reserve on the side we come from, valued at that asset's price.
+
+        :param base: Asset the prices are quoted in.
+        :return: {asset_id: (price, liquidity, route)}; liquidity is in `base` units, route is the
+                 list of asset IDs from `base` to the asset.
+        """
+        best = {base: (1.0, math.inf, [base])}
+        heap = [(-math.inf, base)]
+        done = set()
+        while heap:
+            _, asset_id = heapq.heappop(heap)
+            if asset_id in done:
+                continue
+            done.add(asset_id)
+            price, liquidity, route = best[asset_id]
+            for other, rate, reserve in self.edges.get(asset_id, ()):
+                if other in done:
+                    continue
+                width = min(liquidity, 2 * reserve * price)
+                if other not in best or width > best[other][1]:
+                    best[other] = (price * rate, width, route + [other])
+                    heapq.heappush(heap, (-width, other))
+        return best
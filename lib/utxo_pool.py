@@ -0,0 +1,122 @@
+import contextlib
+import time
+
+
+class UTXOPool:
+    def __init__(self, page_size=500):
+        """
+        In-memory view of the wallet's available UTXOs, indexed by asset, with reservations.
+
+        The pool is loaded once per withdrawal cycle, or only after a UTXO change event when the
+        caller follows wallet events (see mark_stale()). Every withdrawal reserves its amount (and
+        its BEAM fee) before `tx_send`; the reservation is released if sending fails and kept
+        until the next refresh if it succeeds, so two withdrawals can't count the same UTXOs.
+
+        Reservations are kept per process. Several processes sending from the same wallet (see
+        leases.py) can count the same UTXOs; the wallet then rejects one tx_send, and the caller
+        retries that withdrawal after reloading the pool.
+
+        :param page_size: UTXOs per get_utxo page when loading.
+        """
+        self.page_size = page_size
+        self.utxos = {}  # asset_id -> available UTXOs, largest first
+        self.available = {}  # asset_id -> sum of available UTXOs
+        self.reservations = {}  # key -> {asset_id: amount}
+        self.in_flight = set()  # Reservation keys whose tx_send hasn't returned yet
+        self.stale = True  # Set by mark_stale() when the wallet reported UTXO changes
+        self.refreshed_at = 0
+        self.refreshes = 0
+        self.rejected = 0
+
+    async def refresh(self, beam_api):
+        """
+        Reload the UTXO set with one paged walk over get_utxo.
+
+        Reservations of sent withdrawals are dropped (the wallet no longer lists their UTXOs as
+        available); reservations of sends still in flight are kept.
+
+        :param beam_api: AsyncBEAMWalletAPI to load from.
+        """
+        self.stale = False  # Changes reported while loading mark the pool stale again
+        started = time.time()
+        utxos = {}
+        try:
+            async with contextlib.aclosing(beam_api.get_utxo_pages(page_size=self.page_size)) as pages:
+                async for page in pages:
+                    for utxo in page:
+                        if utxo["status"] == 1:  # Only 'available' UTXOs
+                            utxos.setdefault(int(utxo.get("asset_id", 0)), []).append(utxo)
+        except Exception:
+            self.stale = True
+            raise
+
+        for asset_utxos in utxos.values():
+            asset_utxos.sort(key=lambda utxo: utxo["amount"], reverse=True)
+        self.utxos = utxos
+        self.available = {asset_id: sum(u["amount"] for u in asset_utxos) for asset_id, asset_utxos in utxos.items()}
+        self.reservations = {key: r for key, r in self.reservations.items() if key in self.in_flight}
+        self.refreshed_at = started
+        self.refreshes += 1
+
+    def mark_stale(self):
+        """The wallet's UTXO set changed; reload before the next cycle."""
+        self.stale = True
+
+    def needs_refresh(self, max_age):
+        """True if the pool is stale or was loaded more than `max_age` seconds ago."""
+        return self.stale or time.time() - self.refreshed_at > max_age
+
+    def reserved(self, asset_id):
+        return sum(r.get(asset_id, 0) for r in self.reservations.values())
+
+    def free(self, asset_id):
+        """Available amount of an asset that is not reserved."""
+        return self.available.get(int(asset_id), 0) - self.reserved(int(asset_id))
+
+    @staticmethod
+    def _required(asset_id, amount, fee):
+        asset_id = int(asset_id)
+        if asset_id == 0:
+            return {0: amount + fee}
+        return {asset_id: amount, 0: fee}
+
+    def can_fund(self, asset_id, amount, fee):
+        """True if unreserved UTXOs cover `amount` of the asset plus the BEAM fee."""
+        return all(self.free(a) >= needed for a, needed in self._required(asset_id, amount, fee).items())
+
+    def reserve(self, key, asset_id, amount, fee):
+        """
+        Reserve UTXOs for a withdrawal.
+
+        :param key: Withdrawal ID.
+        :return: False if the free UTXOs can't fund it.
+        """
+        if not self.can_fund(asset_id, amount, fee):
+            self.rejected += 1
+            return False
+        self.reservations[key] = self._required(asset_id, amount, fee)
+        self.in_flight.add(key)
+        return True
+
+    def commit(self, key):
+        """The withdrawal was sent; keep its reservation until the next refresh."""
+        self.in_flight.discard(key)
+
+    def release(self, key):
+        """The withdrawal was not sent; free its reservation."""
+        self.in_flight.discard(key)
+        self.reservations.pop(key, None)
+
+    def stats(self):
+        """
+        Available and reserved amounts per asset.
+        """
+        return {
+            "refreshes": self.refreshes,
+            "rejected": self.rejected,
+            "in_flight": len(self.in_flight),
+            "assets": {
+                asset_id: {"utxos": len(self.utxos[asset_id]), "available": self.available[asset_id], "reserved": self.reserved(asset_id)}
+                for asset_id in self.utxos
+            },
+        }
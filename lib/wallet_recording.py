@@ -0,0 +1,156 @@
+import asyncio
+import atexit
+import gzip
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from lib.beam import AsyncBEAMWalletAPI, BEAMWalletAPIError
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + "t") if path.endswith(".gz") else open(path, mode)
+
+
+def process_path(path):
+    """`path` with the process ID before its extensions, e.g. capture.jsonl.gz -> capture.1234.jsonl.gz."""
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, f"{stem}.{os.getpid()}{dot}{extensions}")
+
+
+class WalletRecorder:
+    def __init__(self, path):
+        """
+        Append every wallet request/response pair to a JSON Lines file.
+
+        Each line is {"t": sent_at, "d": elapsed, "m": method, "p": params, "r": result}
+        (or "e": [code, message] for errors). Paths ending in '.gz' are gzip-compressed.
+        Every process records to its own file (see process_path()), so services sharing one
+        BEAM_WALLET_API_RECORD setting don't interleave their writes. Records are flushed as
+        they are written, and the file is closed with the client or at exit.
+
+        :param path: File name; the process ID is inserted before its extensions.
+        """
+        self.path = process_path(path)
+        self.file = _open(self.path, "a")
+        self.records = 0
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def record(self, method, params, result, started, elapsed):
+        entry = {"t": round(started, 6), "d": round(elapsed, 6), "m": method, "p": params}
+        if isinstance(result, BEAMWalletAPIError):
+            entry["e"] = [result.code, result.message]
+        else:
+            entry["r"] = result
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+
+        with self._lock:
+            if self.file.closed:
+                return
+            self.file.write(line)
+            self.file.flush()
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+
+class ReplayBEAMWalletAPI(AsyncBEAMWalletAPI):
+    def __init__(self, path, speed=1.0, **kwargs):
+        """
+        Wallet client that serves responses from a WalletRecorder file instead of the network.
+
+        A call is answered with the oldest unused recording of the same method and params. When
+        none is left (e.g. a pager asked for a different page size), the oldest unused recording
+        of the same method is used, so replays stay deterministic for a given call sequence.
+
+        :param path: Recording file written by WalletRecorder.
+        :param speed: 1.0 replays the recorded response latency, 2.0 halves it, None serves at maximum speed.
+        """
+        super().__init__(f"replay://{path}", **kwargs)
+        self.speed = speed
+        self.entries = []
+        self.used = []
+        self._exact = defaultdict(deque)  # (method, params) -> entry indexes
+        self._by_method = defaultdict(deque)  # method -> entry indexes
+        self.served = 0
+        self.fallbacks = 0
+        self.misses = 0
+
+        for entry in self._read(path):
+            i = len(self.entries)
+            self.entries.append(entry)
+            self._exact[self._key(entry["m"], entry["p"])].append(i)
+            self._by_method[entry["m"]].append(i)
+        self.used = [False] * len(self.entries)
+
+    @staticmethod
+    def _read(path):
+        """Recorded entries; a gzip file of a killed process lacks its end marker but is read up to its last flush."""
+        with _open(path, "r") as f:
+            try:
+                for line in f:
+                    if line.strip() and line.endswith("\n"):
+                        yield json.loads(line)
+            except EOFError:
+                pass
+
+    @staticmethod
+    def _key(method, params):
+        return method, json.dumps(params or {}, sort_keys=True)
+
+    def _take(self, queue):
+        while queue and self.used[queue[0]]:
+            queue.popleft()
+        if not queue:
+            return None
+        i = queue.popleft()
+        self.used[i] = True
+        return self.entries[i]
+
+    def _next(self, method, params):
+        entry = self._take(self._exact[self._key(method, params)])
+        if entry is None:
+            entry = self._take(self._by_method[method])
+            if entry is not None:
+                self.fallbacks += 1
+        if entry is None:
+            self.misses += 1
+        else:
+            self.served += 1
+        return entry
+
+    async def _post(self, method, params=None, stats=None):
+        entry = self._next(method, params or {})
+        if entry is None:
+            raise BEAMWalletAPIError(None, f"No recorded response for {method}")
+        if self.speed:
+            await asyncio.sleep(entry["d"] / self.speed)
+        if stats is not None:
+            stats.update(elapsed=entry["d"], bytes=0)
+        if "e" in entry:
+            raise BEAMWalletAPIError(*entry["e"])
+        return entry["r"]
+
+    async def _post_batch(self, calls, max_size=100, concurrency=1):
+        results = []
+        for method, params in calls:
+            try:
+                results.append(await self._post(method, params))
+            except BEAMWalletAPIError as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        """
+        Replay counters: recorded entries, served calls, method-level fallbacks and misses.
+        """
+        return {
+            "recorded": len(self.entries),
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "misses": self.misses,
+        }
@@ -0,0 +1,56 @@
+"""
+Convert address balances stored as decimal strings to Int64.
+
+Run it with the services stopped, before starting versions that update balances with `$inc`
+(which fails on string amounts). It is safe to run repeatedly: an address is only rewritten if
+its string amounts are still unchanged, anything skipped is picked up by the next run.
+    python migrate_balances.py --dry-run
+    python migrate_balances.py
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+from balances import to_amount
+from db import db
+
+
+async def migrate(batch_size=1000, dry_run=False):
+    scanned = converted = 0
+    ops = []
+
+    async def flush():
+        nonlocal converted, ops
+        if ops and not dry_run:
+            result = await db.addresses.bulk_write(ops, ordered=False)
+            converted += result.modified_count
+        elif dry_run:
+            converted += len(ops)
+        ops = []
+
+    async for address in db.addresses.find({}, {"balance": 1}):
+        scanned += 1
+        query = {"_id": address["_id"]}
+        update = {}
+        for kind in ("available", "locked"):
+            for asset_id, amount in address.get("balance", {}).get(kind, {}).items():
+                if isinstance(amount, str):
+                    field = f"balance.{kind}.{asset_id}"
+                    query[field] = amount
+                    update[field] = to_amount(amount)
+
+        if update:
+            ops.append(UpdateOne(query, {"$set": update}))
+        if len(ops) >= batch_size:
+            await flush()
+
+    await flush()
+    print(f"✅ Scanned {scanned} addresses, {'would convert' if dry_run else 'converted'} {converted}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert string balances to Int64")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only count addresses that need converting")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.dry_run))
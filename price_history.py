@@ -0,0 +1,102 @@
+"""
+Price history.
+
+Every price sample (BEAM/USD from CoinGecko, DEX rates of every priced asset) is folded into
+minute, hour and day buckets of `db.price_history` as it is recorded: one upsert per level
+keeps open/high/low/close plus sum and count for the average. Minute and hour buckets carry an
+`expires` date and are removed by a TTL index; day buckets are kept.
+
+A series is named `<asset_id>:<quote>`, e.g. `0:usd` for BEAM/USD or `7:beam` for asset 7 in BEAM.
+"""
+import datetime
+
+from pymongo import UpdateOne
+from db import db
+
+# level -> (bucket seconds, retention in seconds or None to keep forever)
+LEVELS = {
+    "minute": (60, 2 * 86400),
+    "hour": (3600, 90 * 86400),
+    "day": (86400, None),
+}
+
+
+def series_name(asset_id, quote):
+    return f"{asset_id}:{quote}"
+
+
+def bucket_start(at, level):
+    seconds = LEVELS[level][0]
+    ts = int(at.replace(tzinfo=datetime.timezone.utc).timestamp())
+    return datetime.datetime.utcfromtimestamp(ts - ts % seconds)
+
+
+async def record_samples(samples, at=None):
+    """
+    Record price samples in all rollup levels with one bulk write.
+
+    :param samples: {series: price}; None prices are skipped.
+    :param at: Sample time (naive UTC datetime), now if None.
+    """
+    at = at or datetime.datetime.utcnow()
+    ops = []
+    for series, price in samples.items():
+        if price is None:
+            continue
+        price = float(price)
+        for level, (_, retention) in LEVELS.items():
+            bucket = bucket_start(at, level)
+            on_insert = {"series": series, "level": level, "bucket": bucket, "open": price}
+            if retention:
+                on_insert["expires"] = bucket + datetime.timedelta(seconds=retention)
+            ops.append(UpdateOne(
+                {"_id": f"{series}:{level}:{int(bucket.replace(tzinfo=datetime.timezone.utc).timestamp())}"},
+                {
+                    "$setOnInsert": on_insert,
+                    "$set": {"close": price, "updated": at},
+                    "$min": {"low": price},
+                    "$max": {"high": price},
+                    "$inc": {"sum": price, "count": 1},
+                },
+                upsert=True
+            ))
+    if ops:
+        await db.price_history.bulk_write(ops, ordered=False)
+
+
+def choose_level(start, end, max_points=1000):
+    """
+    Finest level that covers [start, end] within its retention and with at most `max_points` buckets.
+    """
+    age = (datetime.datetime.utcnow() - start).total_seconds()
+    for level, (seconds, retention) in LEVELS.items():
+        if (retention is None or age <= retention) and (end - start).total_seconds() / seconds <= max_points:
+            return level
+    return "day"
+
+
+async def price_history(series, start, end=None, level=None, max_points=1000):
+    """
+    Price buckets of a series, oldest first.
+
+    :param series: Series name, see series_name().
+    :param start: Range start (naive UTC datetime).
+    :param end: Range end, now if None.
+    :param level: 'minute', 'hour' or 'day'; chosen from the range if None.
+    :param max_points: Max buckets returned.
+    :return: (level, [{"t", "open", "high", "low", "close", "avg"}])
+    """
+    end = end or datetime.datetime.utcnow()
+    level = level or choose_level(start, end, max_points)
+    query = {"series": series, "level": level, "bucket": {"$gte": bucket_start(start, level), "$lte": end}}
+    points = []
+    async for doc in db.price_history.find(query).sort("bucket", 1).limit(max_points):
+        points.append({
+            "t": int(doc["bucket"].replace(tzinfo=datetime.timezone.utc).timestamp()),
+            "open": doc["open"],
+            "high": doc["high"],
+            "low": doc["low"],
+            "close": doc["close"],
+            "avg": doc["sum"] / doc["count"],
+        })
+    return level, points
@@ -1,27 +1,59 @@
 from __future__ import print_function
 import math
 import asyncio
-import requests
 import json
 import datetime
+import contextlib
+import hashlib
+import time
 import traceback
-from lib.beam import BEAMWalletAPI
+from lib.beam import BEAMWalletAPIError
 from db import db
-from config import BEAM_API_RPC, send_to_logs, CONFIRMATION_THRESHOLD
+from balances import read_totals, verify_totals, init_totals, OPEN_WITHDRAWAL_STATUSES
+from ledger import LedgerBatch, apply_pending_entries, take_snapshots
+from lib.address_index import AddressIndex
+from lib.keyed_executor import KeyedExecutor
+from lib.utxo_pool import UTXOPool
+from lib.price_graph import PriceGraph
+from price_history import record_samples, series_name
+from lib.jobs import JobScheduler
+from leases import Lease, ShardLeases, keep_leases
+from config import create_beam_api, send_to_logs, CONFIRMATION_THRESHOLD, TX_SYNC_LOOKBACK, TX_WORKERS
+from config import TX_SAFETY_SYNC_INTERVAL, ASSET_REFRESH_INTERVAL
+from config import WITHDRAWAL_WORKERS, WITHDRAWAL_INTERVAL, WITHDRAWAL_RETRY_DELAY, WITHDRAWAL_SHARDS, WITHDRAWAL_CLAIM_TIMEOUT
 from config import VERIFIED_CA, SPAM_CA, DEX_CONTRACT_ID
+from collections import deque
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 import aiohttp
 
 
 # Configuration
-beam_api = BEAMWalletAPI(BEAM_API_RPC)
-
-wallet_status = beam_api.wallet_status()
-print(beam_api.block_details(wallet_status['current_height']))
-#print(beam_api.get_utxo(count=100, sort_field="status", sort_direction="asc", filter={"asset_id": int(0)}))
+beam_api = create_beam_api(
+    default_lane="tx_sync",
+    timeouts={"get_utxo": 120, "assets_list": 120, "invoke_contract": 120},  # Heavy calls
+)
+own_addresses = AddressIndex()  # Membership index of db.addresses, classifies tx parties without queries
+utxo_pool = UTXOPool()  # Wallet UTXOs and withdrawal reservations of this process, refreshed every withdrawal cycle
+tx_sync_lock = asyncio.Lock()  # Polling and wallet events don't process tx pages at the same time
+tx_sync_requested = asyncio.Event()  # Wakes the tx sync loop before its interval is over
+wallet_events_connected = False  # True while the wallet event subscription is up
+
+# Leases, so several processes can run this daemon: each singleton job runs on the process holding
+# its lease, and withdrawals are split by sender over the processes holding the withdrawal shards.
+tx_lease = Lease("tx_sync")  # The wallet has one tx list, so one process ingests it
+job_leases = {name: Lease(name) for name in ("beam_price", "assets", "verify_balances", "addresses", "ledger")}
+withdrawal_shards = ShardLeases("withdrawals", WITHDRAWAL_SHARDS)
+
+STALE_TX_ALERT_FAILURES = 10  # Failed tx_status checks after which an unfinished tx is reported
 
 # Update BEAM Price
 COINGECKO_API_URL = "https://api.coingecko.com/api/v3/simple/price?ids=beam&vs_currencies=usd"
 
+# CA metadata overrides (logos, descriptions)
+CA_UPDATES_URL = "https://raw.githubusercontent.com/vsnation/BeamPay/master/ca_assets_updates.json"
+CA_UPDATES_FILE = "ca_assets_updates.json"  # Bundled copy, used until the feed was fetched once
+
 async def fetch_beam_price():
     """Fetch BEAM price from CoinGecko and store in MongoDB."""
     try:
@@ -40,6 +72,7 @@ async def fetch_beam_price():
             {"$set": {"price": beam_price, "last_updated": datetime.datetime.utcnow()}},
             upsert=True
         )
+        await record_samples({series_name(0, "usd"): beam_price})
 
         print(f"✅ Updated BEAM price: ${beam_price}")
 
@@ -56,144 +89,341 @@ async def load_assets():
     ASSETS = {str(asset["_id"]): asset.get("meta", {}).get("UN", f"Asset {asset['_id']}") for asset in assets}
 
 async def process_transactions():
-    """Processes and updates transactions in the database."""
-    limit = 100
-    skip = 0
-    while True:
-        # Fetch transactions from the API
-        transactions = sorted(beam_api.tx_list(skip=skip, count=limit), key=lambda x: x['create_time'])  # Get all transactions
-        if not transactions:
+    """
+    Processes and updates transactions in the database.
+
+    The wallet returns transactions newest first, so each cycle only walks back to the persisted
+    sync cursor minus TX_SYNC_LOOKBACK (to catch late status changes). Unfinished transactions
+    older than that window are re-checked with batched tx_status calls.
+    """
+    state = await db.sync_state.find_one({"_id": "tx_sync"}) or {}
+    cursor = state.get("create_time")
+    stop_before = cursor - TX_SYNC_LOOKBACK if cursor else None
+    newest = cursor or 0
+
+    # Fetch transactions from the API page by page; closing the pager cancels its prefetch
+    async with contextlib.aclosing(beam_api.tx_list_pages()) as pages:
+        async for page in pages:
+            transactions = sorted(page, key=lambda x: x['create_time'])
+            await process_tx_page(transactions)
+
+            newest = max(newest, transactions[-1]['create_time'])
+            if stop_before is not None and transactions[0]['create_time'] < stop_before:
+                break  # Older transactions were processed in previous cycles
+
+    if stop_before is not None:
+        await refresh_stale_transactions(stop_before)
+
+    # Fenced, so a process that lost the lease while syncing can't move the cursor of the new holder
+    await tx_lease.fenced_update(
+        db.sync_state,
+        {"_id": "tx_sync"},
+        {"$set": {"create_time": newest, "last_updated": datetime.datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def refresh_stale_transactions(before=None, limit=500):
+    """
+    Re-check unfinished transactions using one batch request.
+
+    Txs are taken least recently checked first (`last_checked`), so txs the wallet can't
+    report (e.g. "not found") don't keep the first slots forever. Failed checks are logged and
+    counted in `check_failures`; a tx reaching STALE_TX_ALERT_FAILURES is reported once.
+
+    :param before: Only txs created before this time (the look-back window start); None re-checks all.
+    :param limit: Max txs re-checked per call.
+    """
+    query = {"success": False, "status": {"$nin": [2, 4]}}
+    if before is not None:
+        query["create_time"] = {"$lt": before}
+    stale_txs = await db.txs.find(query, {"_id": 1, "check_failures": 1}).sort([("last_checked", 1), ("create_time", 1)]).limit(limit).to_list(None)
+    if not stale_txs:
+        return
+
+    tx_status = beam_api.batch()
+    for stale_tx in stale_txs:
+        tx_status.tx_status(stale_tx["_id"])
+
+    results = await tx_status.execute()
+    now = time.time()
+    ops = []
+    for stale_tx, result in zip(stale_txs, results):
+        if not isinstance(result, BEAMWalletAPIError):
+            ops.append(UpdateOne({"_id": stale_tx["_id"]}, {"$set": {"last_checked": now}}))
+            continue
+        failures = stale_tx.get("check_failures", 0) + 1
+        print(f"⚠️ tx_status {stale_tx['_id']} failed ({failures}x): {result}")
+        ops.append(UpdateOne(
+            {"_id": stale_tx["_id"]},
+            {"$set": {"last_checked": now, "last_check_error": str(result)}, "$inc": {"check_failures": 1}}
+        ))
+        if failures == STALE_TX_ALERT_FAILURES:
+            await send_to_logs(f"⚠️ *Unresolvable transaction*\n🆔 `{stale_tx['_id']}`\n📢 {failures} failed status checks: `{result}`", parse_mode="Markdown")
+    await db.txs.bulk_write(ops, ordered=False)
+    await process_tx_page([tx for tx in results if not isinstance(tx, BEAMWalletAPIError)])
+
+
+class TxPageWriter:
+    """
+    Database state and pending writes for one page of transactions.
+
+    Existing txs and pending withdrawals of the page are loaded with one `$in` query each, own
+    addresses come from the in-memory index; inserts, updates and ledger entries are queued and
+    sent with bulk writes by flush().
+    """
+
+    def __init__(self, existing_txs, pending_withdrawals, sending=()):
+        self.existing_txs = existing_txs  # tx_id -> tx document
+        self.pending_withdrawals = pending_withdrawals  # tx_id -> pending_withdrawals entry
+        self.sending = set(sending)  # Senders with a withdrawal being sent (tx_send may not have returned yet)
+        self.tx_inserts = []
+        self.tx_ops = []  # (tx_id, op)
+        self.withdrawal_ops = []  # (tx_id, op)
+        self.ledger = LedgerBatch()
+
+    @classmethod
+    async def load(cls, transactions):
+        tx_ids = [tx["txId"] for tx in transactions]
+
+        await own_addresses.refresh(db.addresses)  # Pick up addresses created by the API
+        existing_txs = {tx["_id"]: tx async for tx in db.txs.find({"_id": {"$in": tx_ids}})}
+        pending_withdrawals = {
+            w["txId"]: w async for w in db.pending_withdrawals.find({"txId": {"$in": tx_ids}})
+        }
+        senders = list({tx["sender"] for tx in transactions})
+        sending = {
+            w["sender"] async for w in db.pending_withdrawals.find({"status": "processing", "sender": {"$in": senders}})
+        }
+        return cls(existing_txs, pending_withdrawals, sending)
+
+    def is_own(self, address):
+        return address in own_addresses
+
+    def has_pending_withdrawal(self, tx_id):
+        return tx_id in self.pending_withdrawals
+
+    def is_sending(self, address):
+        return address in self.sending
+
+    def insert_tx(self, tx_data):
+        self.tx_inserts.append(tx_data)
+        self.existing_txs[tx_data["_id"]] = dict(tx_data)
+
+    def update_tx(self, tx_id, fields):
+        self.tx_ops.append((tx_id, UpdateOne({"_id": tx_id}, {"$set": fields})))
+        if tx_id in self.existing_txs:
+            self.existing_txs[tx_id].update(fields)
+
+    def update_withdrawal(self, tx_id, fields):
+        self.withdrawal_ops.append((tx_id, UpdateOne({"txId": tx_id}, {"$set": fields})))
+
+    def close_withdrawal(self, tx_id, status):
+        """Mark a withdrawal as confirmed or failed and remove it from the sender's open withdrawal totals."""
+        withdrawal = self.pending_withdrawals[tx_id]
+        self.update_withdrawal(tx_id, {"status": status})
+        if withdrawal.get("status") not in OPEN_WITHDRAWAL_STATUSES:
             return
-        skip += len(transactions)
+        sender = withdrawal["sender"]
+        self.add_effect(tx_id, "withdraw_close", sender, withdrawal["asset_id"], pending_delta=-int(withdrawal["value"]))
+        self.add_effect(tx_id, "withdraw_close", sender, "0", pending_delta=-int(withdrawal["fee"]))
 
-        for tx in transactions:
-            try:
+    def add_effect(self, tx_id, effect, address, asset_id, available_delta=0, locked_delta=0, pending_delta=0):
+        """Queue a ledger entry for a balance change of an own address."""
+        if self.is_own(address):
+            self.ledger.add(tx_id, effect, address, asset_id, available_delta, locked_delta, pending_delta)
 
-                tx_id = tx["txId"]
-                asset_id = str(tx["asset_id"])  # Convert asset_id to string for MongoDB keys
-                value = int(tx["value"])  # Use integers for calculations
-                fee = int(tx["fee"])  # Use integers for fee
-                status = tx["status"]
-                confirmations = tx.get("confirmations", 0)
-
-                # Fetch existing transaction from the database
-                existing_tx = await db.txs.find_one({"_id": tx_id})
-
-                # Skip if the transaction has already been successfully processed
-                if existing_tx and existing_tx.get("success", False):
-                    continue
-
-                if existing_tx:
-                    update_fields = {}
-
-                    # If the status has changed
-                    if status != existing_tx["status"]:
-                        update_fields["status"] = status
-                        update_fields["status_string"] = tx["status_string"]
-
-                    if status in [2, 4]:
-                        await handle_failed_transaction(tx)
-
-                    # Update confirmations
-                    if existing_tx.get("confirmations", 0) != confirmations:
-                        update_fields["confirmations"] = confirmations
-
-                    # Apply updates if any
-                    if update_fields:
-                        await db.txs.update_one(
-                            {"_id": tx_id},
-                            {"$set": update_fields}
-                        )
-
-
-                     # Refresh available balance only if confirmations are sufficient
-                    if status == 3 and confirmations >= CONFIRMATION_THRESHOLD:
-                        await handle_finalized_transaction(tx)
-                        # Mark transaction as successfully processed
-                        await db.txs.update_one(
-                            {"_id": tx_id},
-                            {"$set": {"success": True}}
-                        )
-
-                elif status in [1, 3, 5]:
-                    # Insert new transaction
-                    tx_data = {
-                        "_id": tx_id,
-                        "status": status,
-                        "status_string": tx["status_string"],
-                        "income": tx.get("income", None),
-                        "type": tx["tx_type"],
-                        "type_string": tx["tx_type_string"],
-                        "asset_id": asset_id,
-                        "value": str(value),
-                        "fee": str(fee),
-                        "sender": tx["sender"],
-                        "receiver": tx["receiver"],
-                        "sender_identity": tx.get("sender_identity", ""),
-                        "receiver_identity": tx.get("receiver_identity", ""),
-                        "comment": tx.get("comment", ""),
-                        "create_time": int(tx["create_time"]),
-                        "confirmations": confirmations,
-                        "kernel": tx.get("kernel", ""),
-                        "failure_reason": tx.get("failure_reason", ""),
-                        "rates": tx.get("rates", []),
-                        "success": False,  # Initial state. If fully checked.
-                        "webhook_sent": {}
-                    }
-                    await db.txs.insert_one(tx_data)
-
-                    # Get human-readable asset name
-                    try:
-                        if tx.get('income', None):
-                            asset_name = ASSETS.get(asset_id, f"??? {asset_id}")
-
-                            # Format value
-                            value_formatted = f"{int(value) / 10**8:,.8f}"  # Assuming 8 decimal places
-                            #await send_to_logs(
-                            #    f"⏳ *Deposit Pending*\n💰 *Amount*: `{value_formatted} {asset_name}`\n📥 *To*: `{tx['receiver']}`\n🔗 *Tx*: `{tx_id}`",
-                            #    parse_mode="Markdown"
-                            #)
-                    except Exception as exc:
-                        print(exc)
-
-                    # Update locked balance
-                    await handle_locked_balance(tx)
-                    # Refresh available balance only if confirmations are sufficient
-                    if confirmations >= CONFIRMATION_THRESHOLD:
-                        await handle_finalized_transaction(tx)
-                        # Mark transaction as successfully processed
-                        await db.txs.update_one(
-                            {"_id": tx_id},
-                            {"$set": {"success": True}}
-                        )
+    async def flush(self):
+        """
+        Write all queued changes.
 
-            except Exception as exc:
-                traceback.print_exc()
+        Ledger entries go first, so a retry after a crash finds them and only applies them.
+        New txs that were recorded meanwhile by someone else (send_withdrawal) were processed from
+        a wrong view: none of the page's changes to them are kept, the next sync handles them as
+        known txs. Only one process ingests txs, so no other page writes the discarded entries.
+        """
+        await self.ledger.write()
+        if self.tx_inserts or self.tx_ops:
+            duplicates = await self._insert_txs()
+            if duplicates:
+                print(f"⚠️ Txs recorded meanwhile, left for the next sync: {sorted(duplicates)}")
+                await self.ledger.discard(duplicates)
+                self.tx_ops = [(tx_id, op) for tx_id, op in self.tx_ops if tx_id not in duplicates]
+                self.withdrawal_ops = [(tx_id, op) for tx_id, op in self.withdrawal_ops if tx_id not in duplicates]
+            if self.tx_ops:
+                await db.txs.bulk_write([op for _, op in self.tx_ops], ordered=False)
+            # Change counter the webhook worker waits on
+            await db.sync_state.update_one({"_id": "tx_updates"}, {"$inc": {"seq": 1}}, upsert=True)
+        if self.withdrawal_ops:
+            await db.pending_withdrawals.bulk_write([op for _, op in self.withdrawal_ops])
+
+        await self.ledger.apply()
+
+        self.tx_inserts, self.tx_ops, self.withdrawal_ops = [], [], []
+        self.ledger.clear()
+
+    async def _insert_txs(self):
+        """
+        Insert the page's new txs.
+
+        :return: IDs of the txs that already existed.
+        """
+        if not self.tx_inserts:
+            return set()
+        try:
+            await db.txs.insert_many(self.tx_inserts, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+            return {self.tx_inserts[error["index"]]["_id"] for error in e.details["writeErrors"]}
+        return set()
+
+
+async def process_tx_page(transactions):
+    """
+    Process a page of transactions with batched reads and bulk writes.
+
+    Up to TX_WORKERS txs run concurrently; txs sharing a sender or receiver keep their order.
+    """
+    if not transactions:
+        return
+
+    async def run(tx):
+        try:
+            await process_transaction(tx, page)
+        except Exception as exc:
+            traceback.print_exc()
+
+    page = await TxPageWriter.load(transactions)
+    executor = KeyedExecutor(TX_WORKERS)
+    for tx in transactions:
+        executor.submit((tx["sender"], tx["receiver"]), run, tx)
+    await executor.join()
+    await page.flush()
+
+
+async def process_transaction(tx, page):
+    """Insert a new transaction or apply status and confirmation changes of a known one."""
+    tx_id = tx["txId"]
+    asset_id = str(tx["asset_id"])  # Convert asset_id to string for MongoDB keys
+    value = int(tx["value"])  # Use integers for calculations
+    fee = int(tx["fee"])  # Use integers for fee
+    status = tx["status"]
+    confirmations = tx.get("confirmations", 0)
+
+    # Existing transaction from the database
+    existing_tx = page.existing_txs.get(tx_id)
+
+    # Skip if the transaction has already been successfully processed
+    if existing_tx and existing_tx.get("success", False):
+        return
+
+    if existing_tx:
+        update_fields = {}
+
+        # If the status has changed
+        if status != existing_tx["status"]:
+            update_fields["status"] = status
+            update_fields["status_string"] = tx["status_string"]
+
+        if status in [2, 4]:
+            await handle_failed_transaction(tx, page)
+
+        # Update confirmations
+        if existing_tx.get("confirmations", 0) != confirmations:
+            update_fields["confirmations"] = confirmations
 
-async def handle_locked_balance(tx):
+        # Apply updates if any
+        if update_fields:
+            page.update_tx(tx_id, update_fields)
+
+
+         # Refresh available balance only if confirmations are sufficient
+        if status == 3 and confirmations >= CONFIRMATION_THRESHOLD:
+            await handle_finalized_transaction(tx, page)
+            # Mark transaction as successfully processed
+            page.update_tx(tx_id, {"success": True})
+
+    elif status in [1, 3, 5]:
+        if not page.has_pending_withdrawal(tx_id) and page.is_sending(tx["sender"]):
+            # Likely the withdrawal being sent, reported before send_withdrawal recorded its txId;
+            # the next sync (or event) picks it up once it did.
+            return
+
+        # Insert new transaction
+        tx_data = {
+            "_id": tx_id,
+            "status": status,
+            "status_string": tx["status_string"],
+            "income": tx.get("income", None),
+            "type": tx["tx_type"],
+            "type_string": tx["tx_type_string"],
+            "asset_id": asset_id,
+            "value": str(value),
+            "fee": str(fee),
+            "sender": tx["sender"],
+            "receiver": tx["receiver"],
+            "sender_identity": tx.get("sender_identity", ""),
+            "receiver_identity": tx.get("receiver_identity", ""),
+            "comment": tx.get("comment", ""),
+            "create_time": int(tx["create_time"]),
+            "confirmations": confirmations,
+            "kernel": tx.get("kernel", ""),
+            "failure_reason": tx.get("failure_reason", ""),
+            "rates": tx.get("rates", []),
+            "success": False,  # Initial state. If fully checked.
+            "webhook_sent": {}
+        }
+        page.insert_tx(tx_data)
+
+        # Get human-readable asset name
+        try:
+            if tx.get('income', None):
+                asset_name = ASSETS.get(asset_id, f"??? {asset_id}")
+
+                # Format value
+                value_formatted = f"{int(value) / 10**8:,.8f}"  # Assuming 8 decimal places
+                #await send_to_logs(
+                #    f"⏳ *Deposit Pending*\n💰 *Amount*: `{value_formatted} {asset_name}`\n📥 *To*: `{tx['receiver']}`\n🔗 *Tx*: `{tx_id}`",
+                #    parse_mode="Markdown"
+                #)
+        except Exception as exc:
+            print(exc)
+
+        # Update locked balance
+        await handle_locked_balance(tx, page)
+        # Refresh available balance only if confirmations are sufficient
+        if confirmations >= CONFIRMATION_THRESHOLD:
+            await handle_finalized_transaction(tx, page)
+            # Mark transaction as successfully processed
+            page.update_tx(tx_id, {"success": True})
+
+async def handle_locked_balance(tx, page):
     """Lock funds in receiver’s wallet and pending in sender’s wallet."""
+    tx_id = tx["txId"]
     receiver = tx["receiver"]
     sender = tx["sender"]
     asset_id = str(tx["asset_id"])
     value = int(tx["value"])
     fee = int(tx.get("fee", 0))
 
-    sender_exists = await db.addresses.find_one({"_id": sender})
-    receiver_exists = await db.addresses.find_one({"_id": receiver})
+    sender_exists = page.is_own(sender)
+    receiver_exists = page.is_own(receiver)
 
-    if sender_exists:
+    if sender_exists and not page.has_pending_withdrawal(tx_id):
+        # Withdrawals were locked by the API when they were requested (withdraw_lock)
         # Deduct from sender's available balance
-        await update_balance(sender, asset_id, available_delta=-value, locked_delta=value)
+        page.add_effect(tx_id, "lock", sender, asset_id, available_delta=-value, locked_delta=value)
         # Deduct BEAM fee from available balance
-        await update_balance(sender, "0", available_delta=-fee, locked_delta=fee)
+        page.add_effect(tx_id, "lock", sender, "0", available_delta=-fee, locked_delta=fee)
         print(f"Locked {value} of Asset {asset_id} & {fee} BEAM from {sender}.")
 
     if receiver_exists:
         # Incoming Transfer: Lock amount for pending deposit
         print(f"Locked {value} for Receiver")
-        await update_balance(receiver, asset_id, locked_delta=value)
+        page.add_effect(tx_id, "lock", receiver, asset_id, locked_delta=value)
 
-async def handle_finalized_transaction(tx):
+async def handle_finalized_transaction(tx, page):
     """Move locked funds to available after confirmation threshold is met."""
     receiver = tx["receiver"]
     sender = tx["sender"]
@@ -210,18 +440,13 @@ async def handle_finalized_transaction(tx):
     value_formatted = f"{value / 10**8:,.8f}"  # Assuming 8 decimal places
 
 
-    sender_exists = await db.addresses.find_one({"_id": sender})
-    receiver_exists = await db.addresses.find_one({"_id": receiver})
+    sender_exists = page.is_own(sender)
+    receiver_exists = page.is_own(receiver)
 
     # Check if TX exists in pending_withdrawals
-    pending_tx = await db.pending_withdrawals.find_one({"txId": tx_id})
-
-    if pending_tx:
-        # Mark withdrawal as "pending" (allow send it again)
-        await db.pending_withdrawals.update_one(
-            {"txId": tx_id},
-            {"$set": {"status": "sent_confirmed"}}
-        )
+    if page.has_pending_withdrawal(tx_id):
+        # Mark withdrawal as confirmed
+        page.close_withdrawal(tx_id, "sent_confirmed")
 
     is_notified = False
     # If sender & receiver are both in the system, notify them both
@@ -236,8 +461,8 @@ async def handle_finalized_transaction(tx):
         # Outgoing or Internal Transfer: Unlock funds (deduct permanently)
         print(f"Finalised. Released Locked -{value + fee} for Sender")
         # Deduct locked funds and fee from sender
-        await update_balance(sender, asset_id, locked_delta=-value)
-        await update_balance(sender, "0", locked_delta=-fee)  # Deduct BEAM fee
+        page.add_effect(tx_id, "finalize", sender, asset_id, locked_delta=-value)
+        page.add_effect(tx_id, "finalize", sender, "0", locked_delta=-fee)  # Deduct BEAM fee
         if not is_notified:
             await send_to_logs(
                 f"*[3/3]*✅ *Withdrawal Confirmed*\n💸 *Amount:* `{value_formatted} {asset_name}`\n📤 *From:* `{sender}`\n🆔 *Kernel:* `{kernel}`",
@@ -247,14 +472,14 @@ async def handle_finalized_transaction(tx):
     if receiver_exists:
         # Incoming Transfer: Move funds to available
         print(f"Finalised. Released Locked -{value} for Receiver")
-        await update_balance(receiver, asset_id, available_delta=value, locked_delta=-value)
+        page.add_effect(tx_id, "finalize", receiver, asset_id, available_delta=value, locked_delta=-value)
         if not is_notified:
             await send_to_logs(
                 f"✅ *Deposit Confirmed*\n💰 *Amount:* `{value_formatted} {asset_name}`\n📥 *To:* `{receiver}`\n🆔 *Kernel:* `{kernel}`",
                 parse_mode="Markdown"
             )
 
-async def handle_failed_transaction(tx):
+async def handle_failed_transaction(tx, page):
     """Mark withdrawal as failed & allow reprocessing without modifying balances."""
     sender = tx["sender"]
     receiver = tx["receiver"]
@@ -264,17 +489,10 @@ async def handle_failed_transaction(tx):
     tx_id = tx["txId"]
 
     # Check if TX exists in pending_withdrawals
-    pending_tx = await db.pending_withdrawals.find_one({"txId": tx_id})
-    if pending_tx:
-        # Mark withdrawal as "pending" (allow send it again)
-        await db.pending_withdrawals.update_one(
-            {"txId": tx_id},
-            {"$set": {"status": "failed"}}
-        )
-        await db.txs.update_one(
-            {"_id": tx_id},
-            {"$set": {"success": True}}
-        )
+    if page.has_pending_withdrawal(tx_id):
+        # Mark withdrawal as "failed"
+        page.close_withdrawal(tx_id, "failed")
+        page.update_tx(tx_id, {"success": True})
         await send_to_logs(
             f"❌ *Withdrawal Failed*\n"
             f"🔗 *From:* `{sender}` ➡ *To:* `{receiver}`\n"
@@ -282,16 +500,14 @@ async def handle_failed_transaction(tx):
             f"🆔 *Pending TX:* `{tx_id}`",
             parse_mode="Markdown"
         )
-        sender_exists = await db.addresses.find_one({"_id": sender})
-        if sender_exists:
+        if page.is_own(sender):
             # Refund locked funds and BEAM fee back to sender
-            await update_balance(sender, asset_id, available_delta=value, locked_delta=-value)
-            await update_balance(sender, "0", available_delta=fee, locked_delta=-fee)  # Refund BEAM fee
+            page.add_effect(tx_id, "fail", sender, asset_id, available_delta=value, locked_delta=-value)
+            page.add_effect(tx_id, "fail", sender, "0", available_delta=fee, locked_delta=-fee)  # Refund BEAM fee
         return
 
-    receiver_exists = await db.addresses.find_one({"_id": receiver})
-    if receiver_exists:
-        await update_balance(receiver, asset_id, locked_delta=-value)
+    if page.is_own(receiver):
+        page.add_effect(tx_id, "fail", receiver, asset_id, locked_delta=-value)
         await send_to_logs(
             f"❌ *DEPOSIT Failed*\n"
             f"🔗 *From:* `{sender}` ➡ *To:* `{receiver}`\n"
@@ -299,10 +515,7 @@ async def handle_failed_transaction(tx):
             f"🆔 *Pending TX:* `{tx_id}`",
             parse_mode="Markdown"
         )
-        await db.txs.update_one(
-            {"_id": tx_id},
-            {"$set": {"success": True}}
-        )
+        page.update_tx(tx_id, {"success": True})
 
 
     
@@ -323,92 +536,93 @@ async def handle_failed_transaction(tx):
 #        await update_balance(sender, "0", available_delta=fee, locked_delta=-fee)  # Refund BEAM fee
 
 
-async def update_balance(address, asset_id, available_delta=0, locked_delta=0):
-    """Update balance for a specific address and asset."""
-    address_data = await db.addresses.find_one({"_id": address})
-    if not address_data:
-        # print(f"Address not found: {address}")
-        return
+ADDRESS_FIELDS = ("own_id", "type", "identity", "create_time", "category", "comment", "wallet_id")  # Copied from addr_list
 
-    # Read current balances
-    current_available = int(address_data["balance"]["available"].get(asset_id, "0"))
-    current_locked = int(address_data["balance"]["locked"].get(asset_id, "0"))
-
-    # Update balances
-    updated_available = current_available + available_delta
-    updated_locked = current_locked + locked_delta
-
-    # Write updates back to the database
-    await db.addresses.update_one(
-        {"_id": address},
-        {
-            "$set": {
-                f"balance.available.{asset_id}": str(updated_available),
-                f"balance.locked.{asset_id}": str(updated_locked),
-            }
-        }
-    )
-    # print(f"New transaction to {address}. Updated Locked: {updated_available} | Available: {updated_locked}")
 
+def address_fields(addr):
+    """Stored metadata of a wallet address plus its content hash (`sync_hash`)."""
+    fields = {field: addr.get(field, "") for field in ADDRESS_FIELDS}
+    content = "\x1f".join(str(fields[field]) for field in ADDRESS_FIELDS)
+    fields["sync_hash"] = hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+    return fields
 
-async def sync_addresses():
+
+async def sync_addresses(page_size=1000, edit_concurrency=4):
     """
-    Synchronize wallet addresses with the database by fetching the addr_list and adding missing ones.
+    Synchronize wallet addresses with the database.
+
+    addr_list has no server-side paging, so the whole list is fetched once (and held in memory).
+    If its digest matches the last sync, nothing is read from or written to the database.
+    Otherwise each page is compared with the stored content hashes (one `$in` query): new
+    addresses go out with insert_many, changed ones with one bulk_write, and expired ones are
+    extended with batch requests, `edit_concurrency` at a time.
+
+    :param page_size: Addresses compared and written per page.
+    :param edit_concurrency: Max edit_address batch requests in flight.
     """
     try:
-        """
-            Synchronize wallet addresses from the BEAM Wallet API to the database.
-            """
         print("Synchronizing addresses...")
-        addresses = beam_api.addr_list()  # Fetch all addresses
-
+        addresses = await beam_api.addr_list(own=True) or []
+        list_hash = hashlib.blake2b(digest_size=16)
         for addr in addresses:
-            address_id = addr["address"]
-            expired = addr["expired"]
-
-            # Check if the address exists in the database
-            existing_address = await db.addresses.find_one({"_id": address_id})
-            if existing_address and 'identity' not in existing_address:
-                print(f"Updated existed address {address_id}")
-                await db.addresses.update_one(
+            list_hash.update(f"{addr['address']}:{address_fields(addr)['sync_hash']}:{addr['expired']};".encode())
+        digest = list_hash.hexdigest()
+
+        state = await db.sync_state.find_one({"_id": "address_sync"}) or {}
+        if state.get("digest") == digest:
+            print("Address synchronization completed: no changes.")
+            return
+
+        added = updated = extended = failed = 0
+        for start in range(0, len(addresses), page_size):
+            page = [(addr, address_fields(addr)) for addr in addresses[start:start + page_size]]
+            extend_expiration = beam_api.batch(concurrency=edit_concurrency)
+            stored = {
+                doc["_id"]: doc.get("sync_hash")
+                async for doc in db.addresses.find({"_id": {"$in": [addr["address"] for addr, _ in page]}}, {"sync_hash": 1})
+            }
+            new_addresses, changes = [], []
+            for addr, fields in page:
+                address_id = addr["address"]
+                if address_id not in stored:
+                    new_addresses.append(dict(
                         {"_id": address_id},
-                        {"$set": {
-                            "own_id": addr.get("own_id", ""),
-                            "type": addr.get("type", ""),
-                            "identity": addr.get("identity", ""),
-                            "create_time": addr.get("create_time", ""),
-                            "category": addr.get("category", ""),
-                            "comment": addr.get("comment", ""),
-                            "wallet_id": addr.get("wallet_id", ""),
-                        }}
-                )
-                return
-
-            if not existing_address:
-                # Add new address to the database
-                address_data = {
-                    "_id": address_id,
-                    "own_id": addr.get("own_id", ""),
-                    "type": addr.get("type", ""),
-                    "balance": {
-                        "available": {},
-                        "locked": {},
-                    },
-                    "identity": addr.get("identity", ""),
-                    "create_time": addr.get("create_time", ""),
-                    "category": addr.get("category", ""),
-                    "comment": addr.get("comment", ""),
-                    "wallet_id": addr.get("wallet_id", ""),
-                }
-                await db.addresses.insert_one(address_data)
-                print(f"New Address {address_id} found and added.")
-
-            # Check if the address is expired and extend its expiration
-            if expired:
-                print(f"Address {address_id} is expired. Extending expiration to 'never'.")
-                beam_api.edit_address(address=address_id, expiration="never")
-
-        print("Address synchronization completed.")
+                        **fields,
+                        balance={"available": {}, "locked": {}},
+                        added=time.time(),  # Compared with time.time() by AddressIndex.refresh
+                    ))
+                elif stored[address_id] != fields["sync_hash"]:
+                    changes.append(UpdateOne({"_id": address_id}, {"$set": fields}))
+
+                # Extend the expiration of expired addresses to 'never'
+                if addr["expired"]:
+                    extend_expiration.edit_address(address=address_id, expiration="never")
+
+            if new_addresses:
+                try:
+                    await db.addresses.insert_many(new_addresses, ordered=False)
+                except BulkWriteError as e:
+                    if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                        raise  # Duplicates were inserted by the API meanwhile
+                for address in new_addresses:
+                    own_addresses.add(address["_id"])
+            if changes:
+                await db.addresses.bulk_write(changes, ordered=False)
+            added += len(new_addresses)
+            updated += len(changes)
+
+            if extend_expiration:
+                print(f"Extending expiration of {len(extend_expiration)} expired addresses to 'never'.")
+                results = await extend_expiration.execute()
+                for (_, params), result in zip(extend_expiration.calls, results):
+                    if isinstance(result, BEAMWalletAPIError):
+                        failed += 1
+                        print(f"Failed to extend expiration of {params['address']}: {result}")
+                extended += len(extend_expiration)
+
+        if not failed:
+            await db.sync_state.update_one({"_id": "address_sync"}, {"$set": {"digest": digest}}, upsert=True)
+        print(f"Address synchronization completed: {added} added, {updated} updated, {extended} extended.")
 
     except Exception as e:
         print(f"Error synchronizing addresses: {e}")
@@ -418,12 +632,15 @@ async def sync_addresses():
 async def verify_balances():
     """
     Verify wallet balances by comparing the BEAM Wallet API balance with stored balances in the database.
+
+    Reads the running balance totals; a full recount of all addresses only checks those totals,
+    at most every BALANCE_RECOUNT_INTERVAL seconds.
     """
     try:
         print("Verifying wallet balances...")
 
         # Fetch wallet balance from BEAM API
-        wallet_status = beam_api.wallet_status()
+        wallet_status = await beam_api.wallet_status()
         if not wallet_status:
             print("Error: Failed to fetch wallet status from API.")
             return
@@ -441,15 +658,7 @@ async def verify_balances():
             api_balances[asset_id] = {"available": available, "locked": locked}
 
         # Fetch balances from the database
-        db_balances = {}
-        async for address in db.addresses.find({}, {"balance": 1}):
-            for asset_id, amount in address["balance"]["available"].items():
-                db_balances.setdefault(asset_id, {"available": 0, "locked": 0})
-                db_balances[asset_id]["available"] += int(amount)
-
-            for asset_id, amount in address["balance"]["locked"].items():
-                db_balances.setdefault(asset_id, {"available": 0, "locked": 0})
-                db_balances[asset_id]["locked"] += int(amount)
+        db_balances = await read_totals()
 
         # Compare balances
         discrepancies = []
@@ -478,6 +687,15 @@ async def verify_balances():
         else:
             print("✅ All balances match between the API and the database.")
 
+        differences = await verify_totals()
+        if differences:
+            print("⚠️ Balance totals differ from a full recount:")
+            for d in differences:
+                print(f"Asset {d['asset_id']} {d['kind']}: recount {d['expected']} | totals {d['actual']}")
+            await send_to_logs(f"⚠️ Balance totals differ from a full recount: {differences}")
+        elif differences is not None:
+            print("✅ Balance totals match a full recount.")
+
     except Exception as e:
         print(f"Error verifying balances: {e}")
         traceback.print_exc()
@@ -502,17 +720,26 @@ async def sync_assets():
         if not _is_beam_exist:
             await db.assets.insert_one(beam_asset)
 
-        # 1️⃣ Fetch assets from Beam blockchain
-        assets = beam_api.assets_list(refresh=True)
-        if not assets:
-            print("⚠️ No assets found on the Beam blockchain.")
+        # 1️⃣ Fetch assets from Beam blockchain (only after new blocks; from the node every ASSET_REFRESH_INTERVAL)
+        state = await db.sync_state.find_one({"_id": "asset_sync"}) or {}
+        height = (await beam_api.wallet_status())["current_height"]
+        now = datetime.datetime.utcnow().timestamp()
+        if height == state.get("height"):
+            print(f"Assets are up to date at height {height}.")
         else:
-            await process_assets(assets)
+            refresh = now - state.get("refreshed", 0) >= ASSET_REFRESH_INTERVAL
+            assets = await beam_api.assets_list(refresh=refresh)
+            if not assets:
+                print("⚠️ No assets found on the Beam blockchain.")
+            else:
+                await process_assets(assets)
+            synced = {"height": height, "refreshed": now} if refresh else {"height": height}
+            await db.sync_state.update_one({"_id": "asset_sync"}, {"$set": synced}, upsert=True)
 
         # 2️⃣ Fetch assets from Beam DEX (if enabled)
         if DEX_CONTRACT_ID:
             print("🔄 Fetching assets from DEX contract...")
-            dex_assets = beam_api.invoke_contract(contract_file="./dapps/dex_app.wasm", args="role=manager,action=view_all_assets")
+            dex_assets = await beam_api.invoke_contract(contract_file="./dapps/dex_app.wasm", args="role=manager,action=view_all_assets")
             if dex_assets and "output" in dex_assets:
                 try:
                     assets_data = json.loads(dex_assets["output"]).get("res", [])
@@ -525,18 +752,7 @@ async def sync_assets():
             await sync_liquidity_pools()
 
         # 4️⃣ Fetch & Overwrite CA Metadata from External JSON File
-        ca_updates = requests.get("https://raw.githubusercontent.com/vsnation/BeamPay/master/ca_assets_updates.json").json()
-        for asset in ca_updates:
-            asset_id = str(asset["asset_id"])
-            update_data = {}
-            if "logo_url" in asset and asset["logo_url"]:
-                update_data["meta.OPT_FAVICON_URL"] = asset["logo_url"]
-            if "about" in asset and asset["about"]:
-                update_data["meta.ABOUT"] = asset["about"]
-
-            if update_data:
-                await db.assets.update_one({"_id": asset_id}, {"$set": update_data})
-                print(f"✅ Updated asset {asset_id}: {update_data}")
+        await apply_ca_updates(await fetch_ca_updates())
 
         print("✅ Asset synchronization completed.")
 
@@ -545,10 +761,104 @@ async def sync_assets():
         traceback.print_exc()
 
 
+async def fetch_ca_updates(timeout=10):
+    """
+    Fetch the CA metadata override feed with a conditional request.
+
+    The last response and its ETag/Last-Modified are kept in `db.sync_state` ("ca_updates"); a 304
+    or a failed request returns that copy, and the bundled CA_UPDATES_FILE is used if there is none.
+
+    :param timeout: Seconds before the request is given up.
+    :return: List of override entries.
+    """
+    state = await db.sync_state.find_one({"_id": "ca_updates"}) or {}
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with session.get(CA_UPDATES_URL, headers=headers) as response:
+                if response.status == 304:
+                    return state["updates"]
+                response.raise_for_status()
+                updates = json.loads(await response.text())
+                await db.sync_state.update_one(
+                    {"_id": "ca_updates"},
+                    {"$set": {
+                        "updates": updates,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                        "fetched": datetime.datetime.utcnow(),
+                    }},
+                    upsert=True
+                )
+                return updates
+    except Exception as e:
+        print(f"⚠️ Failed to fetch CA metadata updates ({e!r}), using the {'cached' if 'updates' in state else 'bundled'} copy.")
+
+    if "updates" in state:
+        return state["updates"]
+    with open(CA_UPDATES_FILE) as f:
+        return json.load(f)
+
+
+async def apply_ca_updates(ca_updates):
+    """
+    Overwrite asset metadata with the CA override entries whose content changed.
+
+    The hash of the applied override is stored on the asset (`ca_hash`); process_assets removes
+    it when it rewrites an asset's metadata, so the override is applied again.
+    """
+    overrides = {}
+    for asset in ca_updates:
+        update_data = {}
+        if "logo_url" in asset and asset["logo_url"]:
+            update_data["meta.OPT_FAVICON_URL"] = asset["logo_url"]
+        if "about" in asset and asset["about"]:
+            update_data["meta.ABOUT"] = asset["about"]
+        if update_data:
+            content = json.dumps(update_data, sort_keys=True)
+            update_data["ca_hash"] = hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+            overrides[str(asset["asset_id"])] = update_data
+
+    updates = [
+        UpdateOne({"_id": asset["_id"]}, {"$set": overrides[asset["_id"]]})
+        async for asset in db.assets.find({"_id": {"$in": list(overrides)}}, {"ca_hash": 1})
+        if asset.get("ca_hash") != overrides[asset["_id"]]["ca_hash"]
+    ]
+    if updates:
+        await db.assets.bulk_write(updates, ordered=False)
+    print(f"✅ Applied CA metadata updates to {len(updates)} assets.")
+
+
 async def process_assets(assets, is_dex=False):
-    """Processes and updates asset data in the database."""
-    for asset in assets:
-        asset_id = str(asset["asset_id"] if not is_dex else asset["aid"])
+    """
+    Processes and updates asset data in the database.
+
+    Assets whose content hash matches the stored one are skipped without parsing; the rest are
+    upserted with one bulk write. Chain and DEX records keep separate hashes.
+    """
+    hash_field = "dex_sync_hash" if is_dex else "sync_hash"
+    asset_ids = [str(asset["asset_id"] if not is_dex else asset["aid"]) for asset in assets]
+    stored = {
+        doc["_id"]: doc.get(hash_field)
+        async for doc in db.assets.find({"_id": {"$in": asset_ids}}, {hash_field: 1})
+    }
+
+    updates = []
+    for asset_id, asset in zip(asset_ids, assets):
+        # Check if asset is verified
+        is_verified = int(asset_id) in VERIFIED_CA if VERIFIED_CA else False
+        is_spam = int(asset_id) in SPAM_CA if SPAM_CA else False
+
+        content = json.dumps([asset, is_verified, is_spam], sort_keys=True, default=str)
+        content_hash = hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+        if stored.get(asset_id) == content_hash:
+            continue  # Unchanged since the last sync
+
         metadata = asset.get("metadata", "")
 
         # Parse metadata (convert metadata string to dict)
@@ -568,33 +878,31 @@ async def process_assets(assets, is_dex=False):
             except Exception:
                 pass  # Keep default
 
-        # Check if asset is verified
-        is_verified = int(asset_id) in VERIFIED_CA if VERIFIED_CA else False
-        is_spam = int(asset_id) in SPAM_CA if SPAM_CA else False
-
         # Prepare asset data
         asset_data = {
-            "_id": asset_id, "asset_id": int(asset_id), "decimals": decimals,
+            "asset_id": int(asset_id), "decimals": decimals,
             "metadata": metadata, "meta": meta,
             "confirmations": asset.get("confirmations", 0), "height": asset.get("height", 0),
             "issue_height": asset.get("issue_height", 0), "owner_id": asset.get("owner_id", ""),
-            "is_verified": is_verified, "is_spam": is_spam
+            "is_verified": is_verified, "is_spam": is_spam,
+            hash_field: content_hash,
         }
-
-        # Update or insert asset into the database
-        existing_asset = await db.assets.find_one({"_id": asset_id})
-        if existing_asset:
-            del asset_data["_id"]
-            await db.assets.update_one({"_id": asset_id}, {"$set": asset_data})
-        else:
-            await db.assets.insert_one(asset_data)
+        # A rewritten `meta` lost its CA overrides; unsetting ca_hash has them applied again
+        updates.append(UpdateOne({"_id": asset_id}, {"$set": asset_data, "$unset": {"ca_hash": ""}}, upsert=True))
+        if asset_id not in stored:
             print(f"✅ Inserted new asset {asset_id}")
 
-    print(f"✅ Processed {len(assets)} assets ({'DEX' if is_dex else 'Blockchain'})")
+    # Update or insert changed assets in the database
+    if updates:
+        await db.assets.bulk_write(updates, ordered=False)
+
+    print(f"✅ Processed {len(assets)} assets ({'DEX' if is_dex else 'Blockchain'}), {len(updates)} changed")
 
 async def sync_liquidity_pools():
     """
     Synchronize liquidity pool data from the Beam DEX contract and update db.assets with only rates.
+
+    Assets without a BEAM pool are priced over multi-hop routes (see lib/price_graph.py).
     """
     if not DEX_CONTRACT_ID:
         print("⚠️ No DEX_CONTRACT_ID found. Skipping liquidity sync.")
@@ -604,7 +912,7 @@ async def sync_liquidity_pools():
         print("🔄 Fetching liquidity pools from DEX...")
 
         # Call the DEX contract
-        pools_response = beam_api.invoke_contract(
+        pools_response = await beam_api.invoke_contract(
             contract_file="./dapps/dex_app.wasm",
             args=f"role=manager,action=pools_view,cid={DEX_CONTRACT_ID}"
         )
@@ -623,50 +931,37 @@ async def sync_liquidity_pools():
         beam_price_data = await db.price.find_one({"_id": "beam_usd"})
         beam_price = float(beam_price_data["price"]) if beam_price_data else 0
 
-        # Dictionary to store updates
-        asset_updates = {}
-
-        for pool in pools_data:
-            aid1, aid2 = str(pool["aid1"]), str(pool["aid2"])
-
-            # Get rates
-            rate1_2 = float(pool.get("k1_2", 0))
-            rate2_1 = float(pool.get("k2_1", 0))
-
-            # BEAM Price Calculation
-            rate_beam_1, rate_beam_2 = None, None
-            if aid1 == "0":
-                rate_beam_2 = rate1_2
-            elif aid2 == "0":
-                rate_beam_1 = rate2_1
-
-            # USD Pricing
-            rate1_usd, rate2_usd = None, None
-            if beam_price > 0:
-                rate1_usd = rate_beam_1 * beam_price if rate_beam_1 else None
-                rate2_usd = rate_beam_2 * beam_price if rate_beam_2 else None
-
-            # Store price conversions in each asset
-            asset_updates[aid1] = {
-                f"rate_{aid1}_{aid2}": str(rate1_2),
-                "rate_beam": str(rate_beam_1) if rate_beam_1 else None,
-                "rate_usd": str(rate1_usd) if rate1_usd else None
-            }
-
-            asset_updates[aid2] = {
-                f"rate_{aid2}_{aid1}": str(rate2_1),
-                "rate_beam": str(rate_beam_2) if rate_beam_2 else None,
-                "rate_usd": str(rate2_usd) if rate2_usd else None
-            }
+        # Price every asset reachable from BEAM over its most liquid route
+        graph = PriceGraph(pools_data)
+        prices = graph.prices(base="0")
+
+        asset_updates = {aid: {} for aid in graph.assets() | {"0"}}
+        for (aid1, aid2), pool in graph.pairs.items():
+            asset_updates[aid1][f"rate_{aid1}_{aid2}"] = str(float(pool.get("k1_2", 0)))
+            asset_updates[aid2][f"rate_{aid2}_{aid1}"] = str(float(pool.get("k2_1", 0)))
+
+        for aid, data in asset_updates.items():
+            rate_beam, liquidity, route = prices.get(aid, (None, None, None))
+            rate_usd = rate_beam * beam_price if rate_beam and beam_price > 0 else None
+            data.update({
+                "rate_beam": str(rate_beam) if rate_beam else None,
+                "rate_usd": str(rate_usd) if rate_usd else None,
+                "rate_route": route,
+                "rate_liquidity_beam": str(liquidity / 10**8) if route and len(route) > 1 else None,
+            })
 
         # Batch update asset prices
-        asset_update_queries = [
-            db.assets.update_one({"_id": aid}, {"$set": data}, upsert=True)
-            for aid, data in asset_updates.items()
-        ]
-
-        # Execute all updates in parallel
-        await asyncio.gather(*asset_update_queries)
+        await db.assets.bulk_write(
+            [UpdateOne({"_id": aid}, {"$set": data}, upsert=True) for aid, data in asset_updates.items()],
+            ordered=False
+        )
+        await record_samples({
+            series_name(aid, quote): data[f"rate_{quote}"]
+            for aid, data in asset_updates.items() if aid != "0"
+            for quote in ("beam", "usd")
+        })
+        priced = sum(1 for aid in asset_updates if aid in prices)
+        print(f"Priced {priced} of {len(asset_updates)} DEX assets in BEAM.")
 
         print("✅ Liquidity pools synchronized successfully.")
 
@@ -675,88 +970,213 @@ async def sync_liquidity_pools():
         traceback.print_exc()
 
 
-async def process_withdrawal_queue():
-    """Process pending withdrawals securely (avoid duplicate TXs & ensure UTXOs exist)."""
+class WithdrawalScheduler:
+    def __init__(self, workers=WITHDRAWAL_WORKERS, batch_size=1000, per_sender=10):
+        """
+        Sends pending withdrawals oldest first, round-robin across senders, up to `workers` at a time.
 
-    print("Processing Pending withdrawals.")
-    async for tx in db.pending_withdrawals.find({"status": "pending"}):
-        try:
-            sender = tx["sender"]
-            asset_id = tx["asset_id"]
-            amount = int(tx["value"])
-            fee = int(tx["fee"])
-            receiver = tx["receiver"]
-            comment = tx.get('comment', "")
-
-            # TUDO Double check SENDER's address balance and math.
-            sender_data = await db.addresses.find_one({"_id": sender})
-
-            # Extract Balances
-            available_balance = int(sender_data["balance"]["available"].get(str(asset_id), "0"))
-            locked_balance = int(sender_data["balance"]["locked"].get(str(asset_id), "0"))
-            available_beam = int(sender_data["balance"]["available"].get("0", "0"))  # BEAM (for gas fees)
-            locked_beam = int(sender_data["balance"]["locked"].get("0", "0"))
-
-            # Validate Locked Balance Matches Pending Withdrawals
-            pending_withdrawals = await db.pending_withdrawals.find({"sender": sender, "status": {"$ne": "sent_confirmed"}}).to_list(None)
-            pending_total = 0
-            pending_beam_fees = 0  # Separate BEAM fee total
-            total_pending_beam = 0
-            
-            for t in pending_withdrawals:
-                if int(t["asset_id"]) == 0:  # If BEAM Withdrawal
-                    total_pending_beam += int(t["value"]) + int(t["fee"])  # Value + Fee
-                elif t["asset_id"] == asset_id:  # If CA Withdrawal
-                    pending_total += int(t["value"])  # Only Asset Value
-                    pending_beam_fees += int(t["fee"])  # Count BEAM fee separately
-                else:
-                    pending_beam_fees += int(t["fee"])  # Count BEAM fee separately
-                    continue
-
-            total_pending_beam = total_pending_beam + pending_beam_fees
-            pending_total  = total_pending_beam if asset_id == 0 else pending_total
-            
-            if locked_beam != total_pending_beam or locked_balance != pending_total:
-                await db.pending_withdrawals.update_one(
-                    {"_id": tx["_id"]},
-                    {"$set": {"status": "admin_check"}}
-                )
+        Each cycle takes at most `per_sender` due withdrawals of each sender (senders ordered by
+        their oldest one), so one bulk payer can't fill the batch. Each withdrawal is claimed
+        (pending -> processing) with an atomic update before it is sent, and a sender has at most
+        one withdrawal in flight. With several processes, each sends the withdrawals of the
+        senders in its withdrawal shards.
+
+        :param workers: Max withdrawals sent concurrently.
+        :param batch_size: Max withdrawals taken from the queue per cycle.
+        :param per_sender: Max withdrawals of one sender taken per cycle.
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.per_sender = per_sender
+        self.sent = 0
+        self.time_to_send = deque(maxlen=1000)  # Seconds from request to tx_send of recent withdrawals
+
+    async def run_cycle(self):
+        """Claim and send the due part of the queue."""
+        await self.reclaim_stale()
+        now = datetime.datetime.utcnow().timestamp()
+        due = {"status": "pending", "$or": [{"retry_after": {"$exists": False}}, {"retry_after": {"$lte": now}}]}
+        pipeline = [
+            {"$match": due},
+            {"$sort": {"create_time": 1}},
+            {"$group": {"_id": "$sender", "oldest": {"$first": "$create_time"}, "ids": {"$push": "$_id"}}},
+            {"$project": {"oldest": 1, "ids": {"$slice": ["$ids", self.per_sender]}}},
+            {"$sort": {"oldest": 1}},
+        ]
+        by_sender = {}  # Senders in order of their oldest withdrawal
+        ids = []
+        async for group in db.pending_withdrawals.aggregate(pipeline, allowDiskUse=True):
+            if len(ids) >= self.batch_size:
+                break
+            if withdrawal_shards.owns(group["_id"]):
+                by_sender[group["_id"]] = deque()
+                ids.extend(group["ids"])
+        async for withdrawal in db.pending_withdrawals.find({"_id": {"$in": ids}, "status": "pending"}).sort("create_time", 1):
+            by_sender[withdrawal["sender"]].append(withdrawal)
+        by_sender = {sender: queue for sender, queue in by_sender.items() if queue}
+
+        if by_sender:
+            print(f"Processing {sum(len(q) for q in by_sender.values())} pending withdrawals of {len(by_sender)} senders.")
+            # With wallet events, UTXOs are reloaded only after a change (or as a slow safety net)
+            if not wallet_events_connected or utxo_pool.needs_refresh(TX_SAFETY_SYNC_INTERVAL):
+                await utxo_pool.refresh(beam_api)
+            executor = KeyedExecutor(self.workers)
+            while by_sender:
+                for sender in list(by_sender):
+                    executor.submit((sender,), self.dispatch, by_sender[sender].popleft())
+                    if not by_sender[sender]:
+                        del by_sender[sender]
+            await executor.join()
+
+        stats = await self.stats()
+        await db.sync_state.update_one({"_id": "withdrawal_queue"}, {"$set": stats}, upsert=True)
+
+    async def reclaim_stale(self):
+        """
+        Release claims older than WITHDRAWAL_CLAIM_TIMEOUT (the worker crashed or lost its shard).
+
+        Claims that never reached tx_send go back to the queue. Claims that did (`sending_at`) may
+        have been sent, so they are flagged for an admin instead of being sent again.
+        """
+        cutoff = datetime.datetime.utcnow().timestamp() - WITHDRAWAL_CLAIM_TIMEOUT
+        stale = {"status": "processing", "txId": {"$exists": False}, "claimed_at": {"$lt": cutoff}}
+        result = await db.pending_withdrawals.update_many(
+            dict(stale, sending_at={"$exists": False}),
+            {"$set": {"status": "pending"}, "$unset": {"claimed_at": ""}}
+        )
+        if result.modified_count:
+            print(f"♻️ Re-queued {result.modified_count} withdrawals of stale claims.")
+
+        async for withdrawal in db.pending_withdrawals.find(dict(stale, sending_at={"$exists": True})):
+            flagged = await db.pending_withdrawals.update_one(
+                {"_id": withdrawal["_id"], "status": "processing", "txId": {"$exists": False}},
+                {"$set": {"status": "admin_check"}}
+            )
+            if flagged.modified_count:
                 await send_to_logs(
-                    f"🚨 *Balance Mismatch Detected!*\n"
-                    f"📤 *Sender:* `{sender}`\n"
-                    f"🔒 *Locked Balance:* `{locked_balance / 10**8:,.8f} {ASSETS.get(str(asset_id), 'Unknown Asset')}`\n"
-                    f"⏳ *Pending Withdrawals:* `{pending_total / 10**8:,.8f} {ASSETS.get(str(asset_id), 'Unknown Asset')}`\n"
-                    f"🔒 *Locked BEAM:* `{locked_beam / 10**8:,.8f} {ASSETS.get(str(0), 'Unknown Asset')}`\n"
-                    f"⏳ *Pending Withdrawals BEAM:* `{total_pending_beam / 10**8:,.8f} {ASSETS.get(str(0), 'Unknown Asset')}`\n"
-                    f"🆔 *TxID:* `{tx['_id']}`",
+                    f"🚨 *Withdrawal Stuck After tx_send*\n"
+                    f"📤 *Sender:* `{withdrawal['sender']}`\n"
+                    f"💰 *Amount:* `{int(withdrawal['value']) / 10**8:,.8f} {ASSETS.get(str(withdrawal['asset_id']), 'Unknown Asset')}`\n"
+                    f"🆔 *Pending TX:* `{withdrawal['_id']}`\n"
+                    f"Check the wallet before re-queueing it.",
                     parse_mode="Markdown"
                 )
-                continue  # Skip processing to prevent errors
+
+    async def dispatch(self, withdrawal):
+        claimed = await db.pending_withdrawals.find_one_and_update(
+            {"_id": withdrawal["_id"], "status": "pending"},
+            {"$set": {"status": "processing", "claimed_at": datetime.datetime.utcnow().timestamp()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if claimed is None:
+            return  # Claimed by another worker or changed meanwhile
+        if await send_withdrawal(claimed):
+            self.sent += 1
+            self.time_to_send.append(datetime.datetime.utcnow().timestamp() - claimed["create_time"])
+
+    async def stats(self):
+        """
+        Queue depth, age of the oldest pending withdrawal and time-to-send of recent withdrawals.
+        """
+        now = datetime.datetime.utcnow().timestamp()
+        oldest = await db.pending_withdrawals.find_one({"status": "pending"}, sort=[("create_time", 1)])
+        times = sorted(self.time_to_send)
+        return {
+            "queue_depth": await db.pending_withdrawals.count_documents({"status": "pending"}),
+            "oldest_age": round(now - oldest["create_time"], 1) if oldest else 0,
+            "sent": self.sent,
+            "time_to_send_avg": round(sum(times) / len(times), 1) if times else 0,
+            "time_to_send_p95": round(times[int(len(times) * 0.95)], 1) if times else 0,
+            "updated": now,
+        }
+
+
+withdrawal_scheduler = WithdrawalScheduler()
+
+
+async def process_withdrawal_queue():
+    """Process pending withdrawals securely (avoid duplicate TXs & ensure UTXOs exist)."""
+    await withdrawal_scheduler.run_cycle()
 
 
-            # 🔹 Fetch UTXOs & Check Balance Again
-            utxos = beam_api.get_utxo(count=100, sort_field="status", sort_direction="asc", filter={"asset_id": int(asset_id)})
-            available_utxo_amount = sum(utxo["amount"] for utxo in utxos if utxo["status"] == 1)  # Only 'available' UTXOs
+async def retry_withdrawal_later(tx):
+    """Put a claimed withdrawal back into the queue, due again after WITHDRAWAL_RETRY_DELAY."""
+    await db.pending_withdrawals.update_one(
+        {"_id": tx["_id"]},
+        {"$set": {"status": "pending", "retry_after": datetime.datetime.utcnow().timestamp() + WITHDRAWAL_RETRY_DELAY},
+         "$unset": {"sending_at": ""}}
+    )
 
-            print("AVAILABLE UTXOs", available_utxo_amount)
-            print(f"REQUIRED AMOUNT {amount}\t\t Asset ID: {asset_id}")
-            print(f"FEE {fee}\t\t Asset ID: 0")
 
-            # 🔹 If UTXOs are insufficient, delay the TX
-            if available_utxo_amount < (amount + fee) :
-                print(f"🚧 Insufficient UTXOs for {tx['_id']}. Retrying later.")
-                continue  # Try in next cycle
+async def send_withdrawal(tx):
+    """
+    Check and send one claimed withdrawal.
 
-            # 🔹 Mark TX as "processing" before sending (prevents race conditions)
+    :return: True if it was sent.
+    """
+    sending = False  # Once tx_send was attempted, an unexpected error leaves the withdrawal in "processing"
+    try:
+        sender = tx["sender"]
+        asset_id = tx["asset_id"]
+        amount = int(tx["value"])
+        fee = int(tx["fee"])
+        receiver = tx["receiver"]
+        comment = tx.get('comment', "")
+
+        # TUDO Double check SENDER's address balance and math.
+        sender_data = await db.addresses.find_one({"_id": sender})
+
+        # Extract Balances
+        available_balance = int(sender_data["balance"]["available"].get(str(asset_id), "0"))
+        locked_balance = int(sender_data["balance"]["locked"].get(str(asset_id), "0"))
+        available_beam = int(sender_data["balance"]["available"].get("0", "0"))  # BEAM (for gas fees)
+        locked_beam = int(sender_data["balance"]["locked"].get("0", "0"))
+
+        # Validate Locked Balance Matches Pending Withdrawals
+        # (open withdrawal totals: values per asset, all BEAM values and fees under asset 0)
+        pending = sender_data["balance"].get("pending", {})
+        total_pending_beam = int(pending.get("0", 0))
+        pending_total = int(pending.get(str(asset_id), 0))
+
+        if locked_beam != total_pending_beam or locked_balance != pending_total:
             await db.pending_withdrawals.update_one(
                 {"_id": tx["_id"]},
-                {"$set": {"status": "processing"}}
+                {"$set": {"status": "admin_check"}}
+            )
+            await send_to_logs(
+                f"🚨 *Balance Mismatch Detected!*\n"
+                f"📤 *Sender:* `{sender}`\n"
+                f"🔒 *Locked Balance:* `{locked_balance / 10**8:,.8f} {ASSETS.get(str(asset_id), 'Unknown Asset')}`\n"
+                f"⏳ *Pending Withdrawals:* `{pending_total / 10**8:,.8f} {ASSETS.get(str(asset_id), 'Unknown Asset')}`\n"
+                f"🔒 *Locked BEAM:* `{locked_beam / 10**8:,.8f} {ASSETS.get(str(0), 'Unknown Asset')}`\n"
+                f"⏳ *Pending Withdrawals BEAM:* `{total_pending_beam / 10**8:,.8f} {ASSETS.get(str(0), 'Unknown Asset')}`\n"
+                f"🆔 *TxID:* `{tx['_id']}`",
+                parse_mode="Markdown"
             )
-            print(f"🚀 Sending {amount/1e8:.8f} of Asset {asset_id} from {sender[:6]}... to {receiver[:6]}... | Comment: '{comment}'")
-            print(f"AVAILABLE UTXOs: {available_utxo_amount/1e8:.8f} aid: {asset_id} | REQUIRED: {(amount + fee)/1e8:.8f} {asset_id} | Asset ID: {asset_id} | Fee: {fee/1e8:.8f} {asset_id}")
+            return False  # Skip processing to prevent errors
 
-            # 🔹 Send Withdrawal via BeamPay API
-            response = beam_api.tx_send(
+
+        # 🔹 Reserve UTXOs (amount of the asset + BEAM fee) from the cycle's UTXO pool
+        available_utxo_amount = utxo_pool.free(asset_id)
+        print("AVAILABLE UTXOs", available_utxo_amount)
+        print(f"REQUIRED AMOUNT {amount}\t\t Asset ID: {asset_id}")
+        print(f"FEE {fee}\t\t Asset ID: 0")
+
+        # 🔹 If UTXOs are insufficient, delay the TX
+        if not utxo_pool.reserve(tx["_id"], asset_id, amount, fee):
+            print(f"🚧 Insufficient UTXOs for {tx['_id']}. Retrying later.")
+            await retry_withdrawal_later(tx)
+            return False  # Try in a later cycle
+
+        print(f"🚀 Sending {amount/1e8:.8f} of Asset {asset_id} from {sender[:6]}... to {receiver[:6]}... | Comment: '{comment}'")
+        print(f"AVAILABLE UTXOs: {available_utxo_amount/1e8:.8f} aid: {asset_id} | REQUIRED: {(amount + fee)/1e8:.8f} {asset_id} | Asset ID: {asset_id} | Fee: {fee/1e8:.8f} {asset_id}")
+
+        # 🔹 Send Withdrawal via BeamPay API
+        # A claim that reached this point is never re-queued automatically (see reclaim_stale())
+        await db.pending_withdrawals.update_one({"_id": tx["_id"]}, {"$set": {"sending_at": datetime.datetime.utcnow().timestamp()}})
+        sending = True
+        try:
+            response = await beam_api.tx_send(
                 value=amount,
                 fee=fee,
                 sender=sender,
@@ -764,101 +1184,202 @@ async def process_withdrawal_queue():
                 asset_id=asset_id,
                 comment=comment,
             )
+        except BEAMWalletAPIError as e:
+            print(f"tx_send failed: {e}")
+            response = None
 
 
-            # 🔹 If TX fails, revert status
-            if not response or "error" in response:
-                await db.pending_withdrawals.update_one(
-                    {"_id": tx["_id"]},
-                    {"$set": {"status": "pending"}}  # Revert back to pending
-                )
-                await send_to_logs(
-                    f"❌ *Withdrawal Failed (Pending TX)*\n"
-                    f"🔗 *Sender:* `{sender}`\n"
-                    f"💰 *Amount:* `{amount / 10**8:,.8f} {ASSETS.get(str(asset_id), 'Unknown Asset')}`\n"
-                    f"🆔 *Pending TX:* `{pending_tx['_id']}`",
-                    parse_mode="Markdown"
-                )
-                continue  # Retry in next loop
-
-            tx_id = response["txId"]
-
-            # 🔹 Mark TX as "sent"
-            await db.pending_withdrawals.update_one(
-                {"_id": tx["_id"]},
-                {"$set": {"txId": tx_id, "status": "sent"}}
-            )
-
-            # 🔹 Store TX in `db.txs`
-            await db.txs.insert_one({
-                "_id": tx_id,
-                "status": 0,  # Pending
-                "status_string": "pending",
-                "income": False,
-                "comment": comment,
-                "type": "withdrawal",
-                "asset_id": asset_id,
-                "value": str(amount),
-                "fee": str(fee),
-                "sender": sender,
-                "receiver": receiver,
-                "create_time": datetime.datetime.utcnow().timestamp(),
-                "confirmations": 0,
-                "success": False,
-                "webhook_sent": {}
-            })
-
+        # 🔹 If TX fails, revert status
+        if not response or "error" in response:
+            utxo_pool.release(tx["_id"])
+            utxo_pool.mark_stale()  # E.g. another process spent the UTXOs this one reserved
+            await retry_withdrawal_later(tx)  # Revert back to pending
             await send_to_logs(
-                f"*[2/3]* ✅ *Withdrawal Successful*\n"
-                f"💸 *Amount:* `{amount / 10**8:,.8f} {ASSETS.get(str(asset_id), '???')}`\n"
-                f"📤 *From:* `{sender}` ➡ *To:* `{receiver}`\n"
-                f"🆔 *TxID:* `{tx_id}`",
+                f"❌ *Withdrawal Failed (Pending TX)*\n"
+                f"🔗 *Sender:* `{sender}`\n"
+                f"💰 *Amount:* `{amount / 10**8:,.8f} {ASSETS.get(str(asset_id), 'Unknown Asset')}`\n"
+                f"🆔 *Pending TX:* `{tx['_id']}`",
                 parse_mode="Markdown"
             )
-        except Exception as exc:
-            traceback.print_exc()
-            await send_to_logs(traceback.format_exc())
+            return False  # Retry in a later cycle
+
+        utxo_pool.commit(tx["_id"])
+        tx_id = response["txId"]
 
+        # 🔹 Mark TX as "sent"
+        await db.pending_withdrawals.update_one(
+            {"_id": tx["_id"]},
+            {"$set": {"txId": tx_id, "status": "sent", "sent_at": datetime.datetime.utcnow().timestamp()}}
+        )
 
+        # 🔹 Store TX in `db.txs` (unless the tx sync already recorded it)
+        await db.txs.update_one({"_id": tx_id}, {"$setOnInsert": {
+            "status": 0,  # Pending
+            "status_string": "pending",
+            "income": False,
+            "comment": comment,
+            "type": "withdrawal",
+            "asset_id": asset_id,
+            "value": str(amount),
+            "fee": str(fee),
+            "sender": sender,
+            "receiver": receiver,
+            "create_time": datetime.datetime.utcnow().timestamp(),
+            "confirmations": 0,
+            "success": False,
+            "webhook_sent": {}
+        }}, upsert=True)
 
-    await asyncio.sleep(90)  # Retry every 5 seconds
+        await send_to_logs(
+            f"*[2/3]* ✅ *Withdrawal Successful*\n"
+            f"💸 *Amount:* `{amount / 10**8:,.8f} {ASSETS.get(str(asset_id), '???')}`\n"
+            f"📤 *From:* `{sender}` ➡ *To:* `{receiver}`\n"
+            f"🆔 *TxID:* `{tx_id}`",
+            parse_mode="Markdown"
+        )
+        return True
+    except Exception as exc:
+        if not sending:
+            utxo_pool.release(tx["_id"])
+            await retry_withdrawal_later(tx)
+        else:
+            utxo_pool.commit(tx["_id"])  # tx_send may have gone through, keep the UTXOs reserved until the refresh
+        traceback.print_exc()
+        await send_to_logs(traceback.format_exc())
+        return False
 
 
-async def process_updates():
-    """Main function to update rates, addresses."""
-    print("Processing 120 Sec. Updates")
+async def update_assets():
+    """Sync chain and DEX assets, rates and CA metadata, then reload the asset names."""
+    with beam_api.priority("assets"):
+        await sync_assets()
     await load_assets()
-    while True:
-        try:
-            await fetch_beam_price()
-            await sync_assets()
-            await load_assets()
-            await verify_balances()
-            await sync_addresses()
-            await asyncio.sleep(120)
-        except Exception as exc:
-            traceback.print_exc()
-            await send_to_logs(traceback.format_exc())
 
 
+async def check_balances():
+    with beam_api.priority("admin"):
+        await verify_balances()
+
+
+async def update_addresses():
+    with beam_api.priority("admin"):
+        await sync_addresses()
+
+
+async def report_stats():
+    """Print client and job stats and store the job stats in `db.sync_state` ("jobs")."""
+    if beam_api.cache is not None:
+        print(f"Wallet API cache: {beam_api.cache.stats()}")
+    print(f"Wallet API governor: {beam_api.governor.stats()}")
+    print(f"Own address index: {own_addresses.stats()}")
+    print(f"UTXO pool: {utxo_pool.stats()}")
+    stats = scheduler.stats()
+    for name, job in stats.items():
+        print(f"Job {name}: {job['runs']} runs, {job['failures']} failed, last {job['last_duration']}s, lag {job['last_lag']}s")
+    await db.sync_state.update_one({"_id": "jobs"}, {"$set": {"jobs": stats}}, upsert=True)
+
+
+async def sync_transactions():
+    """Process transactions."""
+    print("Processing Onchain Transactions.")
+    with beam_api.priority("tx_sync"):
+        async with tx_sync_lock:
+            await process_transactions()  # Function that processes txs
+
+
+def tx_sync_interval():
+    """Poll every 5 seconds, or every TX_SAFETY_SYNC_INTERVAL while wallet events deliver changes."""
+    return TX_SAFETY_SYNC_INTERVAL if wallet_events_connected else 5  # Avoid hammering the system
+
+
+async def send_withdrawals():
+    """Send queued withdrawals."""
+    with beam_api.priority("withdrawal"):
+        await process_withdrawal_queue()
+
+
+async def maintain_ledger():
+    """Apply ledger entries left by crashed processes, then snapshot the ledger."""
+    await apply_pending_entries()
+    await take_snapshots()
 
-async def process_payments():
+
+async def log_job_error(name, text):
+    await send_to_logs(f"❌ Job {name} failed:\n{text}")
+
+
+# Every job runs in its own loop: a slow job delays only its own next run. Jobs that send
+# withdrawals or write tx pages have no timeout, so they are never cancelled halfway.
+# Jobs with a lease are skipped while another process holds it.
+scheduler = JobScheduler(on_error=log_job_error)
+scheduler.add("beam_price", fetch_beam_price, 120, timeout=60, lease=job_leases["beam_price"])
+scheduler.add("assets", update_assets, 120, timeout=600, lease=job_leases["assets"])
+scheduler.add("verify_balances", check_balances, 120, timeout=300, lease=job_leases["verify_balances"])
+scheduler.add("addresses", update_addresses, 120, timeout=600, lease=job_leases["addresses"])
+scheduler.add("ledger", maintain_ledger, 120, timeout=600, lease=job_leases["ledger"])
+scheduler.add("stats", report_stats, 120, timeout=60)
+scheduler.add("tx_sync", sync_transactions, tx_sync_interval, jitter=0, wake=tx_sync_requested, lease=tx_lease)
+scheduler.add("withdrawals", send_withdrawals, WITHDRAWAL_INTERVAL, jitter=0)
+
+
+async def process_wallet_events():
     """
-    Function to process transactions.
+    Apply wallet push events (BEAM_WALLET_API_WS) as they arrive.
+
+    Changed txs are processed right away, a new block re-checks unfinished txs (confirmations)
+    and UTXO changes mark the withdrawal UTXO pool stale. After every (re)connect a full tx sync
+    runs to pick up changes missed while disconnected. Tx events are only processed while this
+    process holds the tx sync lease.
     """
-    while True:
-        print("Processing Onchain Transactions. 30 Sec.")
-        await process_transactions()  # Function that processes txs
-        await process_withdrawal_queue() # Function that processes mempool
-        await asyncio.sleep(5)  # Avoid hammering the system
+    global wallet_events_connected
+    with beam_api.priority("tx_sync"):
+        async for event, result in beam_api.events():
+            try:
+                if event == "connected":
+                    print("🔔 Subscribed to wallet events")
+                    wallet_events_connected = True
+                    utxo_pool.mark_stale()
+                    tx_sync_requested.set()
+                elif event == "disconnected":
+                    print(f"🔕 Wallet events disconnected: {result!r}")
+                    wallet_events_connected = False
+                    tx_sync_requested.set()
+                elif event == "ev_utxos_changed":
+                    utxo_pool.mark_stale()
+                elif not tx_lease.held:
+                    continue  # Another process ingests txs
+                elif event == "ev_txs_changed":
+                    transactions = sorted(result.get("txs", []), key=lambda x: x['create_time'])
+                    async with tx_sync_lock:
+                        await process_tx_page(transactions)
+                elif event == "ev_system_state":
+                    async with tx_sync_lock:
+                        await refresh_stale_transactions()
+            except Exception as exc:
+                traceback.print_exc()
+                await send_to_logs(traceback.format_exc())
+                tx_sync_requested.set()  # Let the full sync pick up what this event missed
+
 
 async def main():
     """Runs both daemons simultaneously."""
     """Run all tasks concurrently."""
-    tasks = [
-        asyncio.create_task(process_updates()),
-        asyncio.create_task(process_payments()),
-    ]
+    wallet_status = await beam_api.wallet_status()
+    print(await beam_api.block_details(wallet_status['current_height']))
+    await apply_pending_entries()
+    await init_totals()
+    await own_addresses.load(db.addresses)
+    await load_assets()
+
+    leases = [tx_lease, *job_leases.values(), withdrawal_shards]
+    for lease in leases:
+        await lease.heartbeat()  # Take free leases before the first job runs
+    held = [lease.name for lease in leases if isinstance(lease, Lease) and lease.held]
+    print(f"🔒 Holding leases {held}, withdrawal shards {sorted(withdrawal_shards.held())}")
+
+    tasks = [asyncio.create_task(keep_leases(leases)), asyncio.create_task(scheduler.run())]
+    if beam_api.ws_url:
+        tasks.append(asyncio.create_task(process_wallet_events()))
     await asyncio.gather(*tasks)  # Run all tasks concurrently
 
 
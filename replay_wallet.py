@@ -0,0 +1,82 @@
+"""
+Replay recorded wallet API traffic against the payment daemon jobs.
+
+Record a busy period with BEAM_WALLET_API_RECORD set, then replay it without a node:
+    BEAM_WALLET_API_RECORD=capture.jsonl.gz python process_payments.py
+    python replay_wallet.py capture.jsonl.gz --speed max --jobs process_transactions sync_assets
+
+Jobs write to the database configured in DATABASE_URL, so point it at a scratch database.
+"""
+import argparse
+import asyncio
+import time
+
+import process_payments
+from leases import keep_leases
+from lib.wallet_recording import ReplayBEAMWalletAPI
+
+JOBS = ["process_transactions", "sync_assets", "process_withdrawal_queue", "sync_addresses", "verify_balances"]
+
+
+async def take_leases():
+    """
+    Take the leases the jobs check, as main() does, so they don't skip their work.
+
+    :return: The leases, to keep alive with keep_leases.
+    """
+    leases = [process_payments.tx_lease, *process_payments.job_leases.values(), process_payments.withdrawal_shards]
+    for lease in leases:
+        await lease.heartbeat()
+    if not process_payments.tx_lease.held:
+        raise SystemExit("❌ The tx sync lease is held by another process; stop it or use a scratch database.")
+    shards = process_payments.withdrawal_shards
+    if len(shards.held()) < shards.shards:
+        raise SystemExit(f"❌ Holding {len(shards.held())} of {shards.shards} withdrawal shards; stop other processes or use a scratch database.")
+    return leases
+
+
+async def replay(recording, speed, jobs, repeat):
+    beam_api = ReplayBEAMWalletAPI(recording, speed=speed)
+    process_payments.beam_api = beam_api
+    await process_payments.own_addresses.load(process_payments.db.addresses)
+    await process_payments.load_assets()
+
+    leases = await take_leases()
+    keeper = asyncio.create_task(keep_leases(leases))
+    pending = await process_payments.db.pending_withdrawals.count_documents({"status": "pending"})
+    try:
+        for _ in range(repeat):
+            for name in jobs:
+                served = beam_api.served
+                started = time.monotonic()
+                await getattr(process_payments, name)()
+                elapsed = time.monotonic() - started
+                calls = beam_api.served - served
+                rate = calls / elapsed if elapsed else 0
+                print(f"⏱️ {name}: {elapsed:.3f}s | {calls} wallet calls | {rate:,.0f} calls/s")
+    finally:
+        keeper.cancel()
+        await asyncio.gather(keeper, return_exceptions=True)  # keep_leases releases them
+
+    print(f"Replay: {beam_api.stats()}")
+    if "process_withdrawal_queue" in jobs:
+        sent = process_payments.withdrawal_scheduler.sent
+        print(f"Withdrawals: {pending} pending before the replay, {sent} sent")
+        if pending and not sent:
+            raise SystemExit("❌ No withdrawal was sent; the recording may lack their tx_send calls.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded wallet API traffic")
+    parser.add_argument("recording", help="File written with BEAM_WALLET_API_RECORD")
+    parser.add_argument("--speed", default="1", help="Latency multiplier divisor (1 = recorded latency) or 'max'")
+    parser.add_argument("--jobs", nargs="+", default=JOBS[:3], choices=JOBS)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    asyncio.run(replay(args.recording, speed, args.jobs, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
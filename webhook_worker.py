@@ -1,14 +1,20 @@
 import requests
 import asyncio
 from db import db
-from config import BEAMPAY_WEBHOOK_URLS
+from config import BEAMPAY_WEBHOOK_URLS, WEBHOOK_SHARDS
+from leases import ShardLeases, keep_leases
 
 CONFIRMATIONS_REQUIRED = 1
 MAX_RETRIES = 5  # Retry up to 5 times
+SCAN_INTERVAL = 10  # Max seconds between scans
+UPDATE_CHECK_INTERVAL = 1  # Seconds between checks for tx changes written by the payment daemon
 
 # Load assets globally at startup
 ASSETS = {}
 
+# Several workers split the txs by ID; each delivers the webhooks of the txs in its shards
+webhook_shards = ShardLeases("webhooks", WEBHOOK_SHARDS)
+
 async def load_assets():
     """Load asset metadata from the database."""
     global ASSETS
@@ -67,9 +73,26 @@ async def dispatch_webhook(event_type, data):
     #await notify_telegram(event_type, data)
 
 
+async def wait_for_tx_updates(seq):
+    """
+    Wait until the payment daemon wrote tx changes or SCAN_INTERVAL passed.
+
+    :param seq: Last seen value of the daemon's tx change counter.
+    :return: The current counter value.
+    """
+    for _ in range(int(SCAN_INTERVAL / UPDATE_CHECK_INTERVAL)):
+        await asyncio.sleep(UPDATE_CHECK_INTERVAL)
+        state = await db.sync_state.find_one({"_id": "tx_updates"}) or {}
+        if state.get("seq") != seq:
+            return state.get("seq")
+    return seq
+
+
 async def monitor_transactions():
     """Monitor transactions and trigger appropriate webhooks."""
     await load_assets()
+    await webhook_shards.heartbeat()
+    tx_updates_seq = None
     while True:
         transactions = await db.txs.find({
             "$or": [
@@ -82,6 +105,7 @@ async def monitor_transactions():
                 {"status": 2, "webhook_sent.cancelled": {"$ne": True}}
             ]
         }).to_list(None)
+        transactions = [tx for tx in transactions if webhook_shards.owns(tx["_id"])]
         print(f"Found {len(transactions)} Pending Webhooks")
         for tx in transactions:
             tx_id = tx["_id"]
@@ -142,11 +166,18 @@ async def monitor_transactions():
         # Retry failed webhooks
         failed_webhooks = await db.failed_webhooks.find().to_list(None)
         for webhook in failed_webhooks:
+            if not webhook_shards.owns(webhook["data"].get("txId")):
+                continue
             await dispatch_webhook(webhook["event_type"], webhook["data"])
             await db.failed_webhooks.delete_one({"_id": webhook["_id"]})  # Remove if successful
 
-        await asyncio.sleep(10)  # Check every 10 seconds
+        tx_updates_seq = await wait_for_tx_updates(tx_updates_seq)  # Scan again on tx changes, at least every 10 seconds
+
+
+async def main():
+    await asyncio.gather(keep_leases([webhook_shards]), monitor_transactions())
+
 
 if __name__ == "__main__":
     print("Launching Webhook Worker")
-    asyncio.run(monitor_transactions())
+    asyncio.run(main())